@@ -0,0 +1,116 @@
+import boto3
+import logging
+import threading
+from functools import lru_cache
+from typing import Dict, Any, Optional
+from botocore.config import Config as BotoConfig
+from langchain_aws import ChatBedrock
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# One botocore session for the process. boto3's default session isn't safe to create
+# clients from concurrently (e.g. the RAG system initializing in a worker thread)
+_session = boto3.session.Session()
+_client_lock = threading.Lock()
+
+@lru_cache(maxsize=None)
+def _get_aws_credentials() -> frozenset:
+    """AWS credentials from Config without region_name, computed once"""
+    # Drop empty credentials so boto3 falls back to its default provider chain
+    return frozenset(
+        (key, value) for key, value in Config.get_aws_config().items()
+        if key != "region_name" and value
+    )
+
+def uses_converse_api() -> bool:
+    """Whether chat models are routed through the Bedrock Converse API"""
+    # performanceConfig is a Converse API field, so latency-optimized models use Converse
+    return Config.BEDROCK_LATENCY_OPTIMIZED
+
+def _chat_bedrock_kwargs() -> Dict[str, Any]:
+    """ChatBedrock options, adding latency-optimized inference when enabled"""
+    kwargs: Dict[str, Any] = {}
+    if uses_converse_api():
+        kwargs["beta_use_converse_api"] = True
+        kwargs["model_kwargs"] = {"performance_config": {"latency": "optimized"}}
+    return kwargs
+
+class BedrockClient:
+    """Factory for Bedrock chat models sharing one bedrock-runtime client"""
+
+    # boto3 clients are thread-safe and pool connections internally,
+    # so one client per (region, credentials) is shared by every LLM
+    _client_cache: Dict[tuple, Any] = {}
+
+    def __init__(self):
+        self.llm = self._create_bedrock_llm()
+
+    @classmethod
+    def _get_bedrock_runtime_client(cls, region_name: str = None):
+        """Return the cached bedrock-runtime client, creating it on first use"""
+        region_name = region_name or Config.BEDROCK_REGION
+        credentials = _get_aws_credentials()
+        cache_key = (region_name, credentials)
+
+        client = cls._client_cache.get(cache_key)
+        if client is None:
+            with _client_lock:
+                client = cls._client_cache.get(cache_key)
+                if client is None:
+                    logger.info(f"🔌 Creating bedrock-runtime client for region {region_name}")
+                    client = _session.client(
+                        "bedrock-runtime",
+                        region_name=region_name,
+                        config=cls._get_boto_config(),
+                        **dict(credentials)
+                    )
+                    cls._client_cache[cache_key] = client
+                    if Config.BEDROCK_PREWARM:
+                        threading.Thread(target=cls._prewarm_connection, args=(client,), daemon=True).start()
+        return client
+
+    @staticmethod
+    def _prewarm_connection(client):
+        """Open a pooled TLS connection before the first user request"""
+        try:
+            # Cheap read-only call; even an AccessDenied response leaves the
+            # connection in the pool, kept alive by tcp_keepalive
+            client.list_async_invokes(maxResults=1)
+        except Exception as e:
+            logger.debug(f"Bedrock prewarm call finished with: {e}")
+
+    @staticmethod
+    def _get_boto_config() -> BotoConfig:
+        """Connection pool sized for concurrent chat and embedding calls"""
+        return BotoConfig(
+            max_pool_connections=Config.BEDROCK_MAX_POOL_CONNECTIONS,
+            tcp_keepalive=True,
+            retries={"mode": "standard", "max_attempts": Config.BEDROCK_MAX_ATTEMPTS}
+        )
+
+    def _create_bedrock_llm(self):
+        """Create the supervisor LLM"""
+        return ChatBedrock(
+            client=self._get_bedrock_runtime_client(),
+            model_id=Config.BEDROCK_MODEL_ID,
+            **_chat_bedrock_kwargs()
+        )
+
+    def get_llm(self):
+        """Get the supervisor LLM"""
+        return self.llm
+
+def get_runtime_client(region_name: str = None):
+    """Get the shared bedrock-runtime client, defaulting to Config.BEDROCK_REGION"""
+    return BedrockClient._get_bedrock_runtime_client(region_name)
+
+# Global instance, created on first use so importing this module stays cheap
+_instance: Optional[BedrockClient] = None
+
+def get_bedrock_client() -> BedrockClient:
+    """Get the shared BedrockClient, creating it on first access"""
+    global _instance
+    if _instance is None:
+        _instance = BedrockClient()
+    return _instance
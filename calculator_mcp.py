@@ -8,132 +8,166 @@ import asyncio
 import json
 import sys
 import logging
+import os
+
+# Prefer orjson for faster frame encoding/decoding, fall back to stdlib json
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    _dumps = lambda obj: json.dumps(obj).encode()
+    _loads = json.loads
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper())
 logger = logging.getLogger(__name__)
 
+# Static results for the metadata methods, built once at import time
+_INIT_RESULT = {
+    "protocolVersion": "2024-11-05",
+    "capabilities": {
+        "tools": {}
+    },
+    "serverInfo": {
+        "name": "calculator-mcp",
+        "version": "1.0.0"
+    }
+}
+
+_TOOLS_LIST_RESULT = {
+    "tools": [
+        {
+            "name": "add",
+            "description": "Add two numbers together",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "a": {
+                        "type": "number",
+                        "description": "First number to add"
+                    },
+                    "b": {
+                        "type": "number",
+                        "description": "Second number to add"
+                    }
+                },
+                "required": ["a", "b"]
+            }
+        },
+        {
+            "name": "multiply",
+            "description": "Multiply two numbers together",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "a": {
+                        "type": "number",
+                        "description": "First number to multiply"
+                    },
+                    "b": {
+                        "type": "number",
+                        "description": "Second number to multiply"
+                    }
+                },
+                "required": ["a", "b"]
+            }
+        },
+        {
+            "name": "divide",
+            "description": "Divide first number by second number",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "a": {
+                        "type": "number",
+                        "description": "Dividend (number to be divided)"
+                    },
+                    "b": {
+                        "type": "number",
+                        "description": "Divisor (number to divide by)"
+                    }
+                },
+                "required": ["a", "b"]
+            }
+        }
+    ]
+}
+
+def _handle_initialize(request_id, params: dict) -> dict:
+    """Handle the initialize method"""
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "result": _INIT_RESULT
+    }
+
+def _handle_tools_list(request_id, params: dict) -> dict:
+    """Handle the tools/list method"""
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "result": _TOOLS_LIST_RESULT
+    }
+
+def _handle_tools_call(request_id, params: dict) -> dict:
+    """Handle the tools/call method"""
+    tool_name = params.get("name")
+    arguments = params.get("arguments", {})
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("🔍 tools/call received: tool_name=%s, arguments=%s", tool_name, arguments)
+    
+    a = arguments.get("a", 0)
+    b = arguments.get("b", 0)
+    tool_func = _TOOLS.get(tool_name)
+    result = tool_func(a, b) if tool_func else f"Unknown tool: {tool_name}"
+    
+    logger.debug("🔍 tools/call result: %s", result)
+    
+    # Return result in correct format
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "result": {
+            "content": [
+                {
+                    "type": "text",
+                    "text": result
+                }
+            ]
+        }
+    }
+
+# MCP method name -> handler
+_METHOD_HANDLERS = {
+    "initialize": _handle_initialize,
+    "tools/list": _handle_tools_list,
+    "tools/call": _handle_tools_call
+}
+
 async def handle_request(request: dict) -> dict:
     """Handle MCP requests"""
+    # Batch members can be any JSON value; each non-object gets its own error
+    if not isinstance(request, dict):
+        return {
+            "jsonrpc": "2.0",
+            "id": None,
+            "error": {
+                "code": -32600,
+                "message": "Invalid Request"
+            }
+        }
+    
     try:
         method = request.get("method")
         params = request.get("params", {})
         request_id = request.get("id")
         
-        logger.info(f"🔍 handle_request received: method={method}, params={params}, id={request_id}")
-        
-        if method == "initialize":
-            return {
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "result": {
-                    "protocolVersion": "2024-11-05",
-                    "capabilities": {
-                        "tools": {}
-                    },
-                    "serverInfo": {
-                        "name": "calculator-mcp",
-                        "version": "1.0.0"
-                    }
-                }
-            }
-        
-        elif method == "tools/list":
-            return {
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "result": {
-                    "tools": [
-                        {
-                            "name": "add",
-                            "description": "Add two numbers together",
-                            "inputSchema": {
-                                "type": "object",
-                                "properties": {
-                                    "a": {
-                                        "type": "number",
-                                        "description": "First number to add"
-                                    },
-                                    "b": {
-                                        "type": "number",
-                                        "description": "Second number to add"
-                                    }
-                                },
-                                "required": ["a", "b"]
-                            }
-                        },
-                        {
-                            "name": "multiply",
-                            "description": "Multiply two numbers together",
-                            "inputSchema": {
-                                "type": "object",
-                                "properties": {
-                                    "a": {
-                                        "type": "number",
-                                        "description": "First number to multiply"
-                                    },
-                                    "b": {
-                                        "type": "number",
-                                        "description": "Second number to multiply"
-                                    }
-                                },
-                                "required": ["a", "b"]
-                            }
-                        },
-                        {
-                            "name": "divide",
-                            "description": "Divide first number by second number",
-                            "inputSchema": {
-                                "type": "object",
-                                "properties": {
-                                    "a": {
-                                        "type": "number",
-                                        "description": "Dividend (number to be divided)"
-                                    },
-                                    "b": {
-                                        "type": "number",
-                                        "description": "Divisor (number to divide by)"
-                                    }
-                                },
-                                "required": ["a", "b"]
-                            }
-                        }
-                    ]
-                }
-            }
-        
-        elif method == "tools/call":
-            tool_name = params.get("name")
-            arguments = params.get("arguments", {})
-            
-            logger.info(f"🔍 tools/call received: tool_name={tool_name}, arguments={arguments}")
-            
-            if tool_name == "add":
-                result = await add(arguments.get("a", 0), arguments.get("b", 0))
-            elif tool_name == "multiply":
-                result = await multiply(arguments.get("a", 0), arguments.get("b", 0))
-            elif tool_name == "divide":
-                result = await divide(arguments.get("a", 0), arguments.get("b", 0))
-            else:
-                result = f"Unknown tool: {tool_name}"
-            
-            logger.info(f"🔍 tools/call result: {result}")
-            
-            # Return result in correct format
-            return {
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "result": {
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": result
-                        }
-                    ]
-                }
-            }
+        logger.debug("🔍 handle_request received: method=%s, id=%s", method, request_id)
         
-        else:
+        handler = _METHOD_HANDLERS.get(method)
+        if handler is None:
             return {
                 "jsonrpc": "2.0",
                 "id": request_id,
@@ -142,6 +176,8 @@ async def handle_request(request: dict) -> dict:
                     "message": f"Method not found: {method}"
                 }
             }
+        
+        return handler(request_id, params)
     
     except Exception as e:
         logger.error(f"❌ Error in handle_request: {e}")
@@ -154,7 +190,7 @@ async def handle_request(request: dict) -> dict:
             }
         }
 
-async def add(a: float, b: float) -> str:
+def add(a: float, b: float) -> str:
     """Add two numbers"""
     try:
         result = a + b
@@ -162,7 +198,7 @@ async def add(a: float, b: float) -> str:
     except Exception as e:
         return f"Error adding {a} and {b}: {str(e)}"
 
-async def multiply(a: float, b: float) -> str:
+def multiply(a: float, b: float) -> str:
     """Multiply two numbers"""
     try:
         result = a * b
@@ -170,7 +206,7 @@ async def multiply(a: float, b: float) -> str:
     except Exception as e:
         return f"Error multiplying {a} and {b}: {str(e)}"
 
-async def divide(a: float, b: float) -> str:
+def divide(a: float, b: float) -> str:
     """Divide first number by second number"""
     try:
         if b == 0:
@@ -180,35 +216,124 @@ async def divide(a: float, b: float) -> str:
     except Exception as e:
         return f"Error dividing {a} by {b}: {str(e)}"
 
+# Tool name -> arithmetic helper
+_TOOLS = {
+    "add": add,
+    "multiply": multiply,
+    "divide": divide
+}
+
+# Longest request line accepted; asyncio.StreamReader defaults to only 64 KiB
+_MAX_FRAME_BYTES = 16 * 1024 * 1024
+
+_flush_scheduled = False
+
+def _flush_stdout():
+    """Flush buffered responses to stdout"""
+    global _flush_scheduled
+    _flush_scheduled = False
+    sys.stdout.buffer.flush()
+
+def _write_response(response):
+    """Buffer a response and flush once per event loop iteration"""
+    global _flush_scheduled
+    sys.stdout.buffer.write(_dumps(response) + b"\n")
+    if not _flush_scheduled:
+        _flush_scheduled = True
+        asyncio.get_running_loop().call_soon(_flush_stdout)
+
+async def _handle_and_write(line: bytes):
+    """Handle a single request line and write its response to stdout"""
+    # Skip blank keepalive lines and partial writes without paying for a parse error
+    stripped = line.strip()
+    if stripped[:1] not in (b"{", b"["):
+        return
+    
+    try:
+        request = _loads(stripped)
+        if request == []:
+            # JSON-RPC 2.0: an empty batch gets a single Invalid Request error, not an empty array
+            response = {
+                "jsonrpc": "2.0",
+                "id": None,
+                "error": {
+                    "code": -32600,
+                    "message": "Invalid Request"
+                }
+            }
+        elif isinstance(request, list):
+            # JSON-RPC batch: handle members concurrently and reply with one array
+            response = await asyncio.gather(*(handle_request(r) for r in request))
+        else:
+            response = await handle_request(request)
+    except json.JSONDecodeError as e:
+        logger.debug("Skipping malformed JSON line: %s", e)
+        return
+    except Exception as e:
+        response = {
+            "jsonrpc": "2.0",
+            "id": None,
+            "error": {
+                "code": -32603,
+                "message": f"Internal error: {str(e)}"
+            }
+        }
+    
+    # A whole line is written synchronously, so concurrent responses never interleave
+    _write_response(response)
+
+async def _read_frame(reader: asyncio.StreamReader):
+    """Read one request line, or return None after discarding a line longer than _MAX_FRAME_BYTES"""
+    try:
+        return await reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError as e:
+        # EOF: return the unterminated tail like readline() does
+        return e.partial
+    except asyncio.LimitOverrunError as e:
+        overrun = e
+    
+    # Drop the rest of the oversized line so its tail isn't parsed as the next request
+    while overrun is not None:
+        await reader.readexactly(overrun.consumed)
+        try:
+            await reader.readuntil(b"\n")
+            overrun = None
+        except asyncio.IncompleteReadError:
+            overrun = None
+        except asyncio.LimitOverrunError as e:
+            overrun = e
+    return None
+
 async def main():
     """Main function to run the MCP server"""
     logger.info("🚀 Starting Calculator MCP Server")
     
-    # Read from stdin and write to stdout
-    while True:
-        try:
-            line = await asyncio.get_event_loop().run_in_executor(None, sys.stdin.readline)
-            if not line:
-                break
-            
-            request = json.loads(line.strip())
-            response = await handle_request(request)
-            print(json.dumps(response))
-            sys.stdout.flush()
-            
-        except json.JSONDecodeError:
-            continue
-        except Exception as e:
-            error_response = {
+    # Read from stdin asynchronously instead of parking an executor thread per line
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=_MAX_FRAME_BYTES)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    
+    pending = set()
+    
+    # Dispatch each request as its own task so in-flight requests don't block each other
+    while (line := await _read_frame(reader)) != b"":
+        if line is None:
+            logger.warning("⚠️ Dropped request line longer than %s bytes", _MAX_FRAME_BYTES)
+            _write_response({
                 "jsonrpc": "2.0",
                 "id": None,
                 "error": {
-                    "code": -32603,
-                    "message": f"Internal error: {str(e)}"
+                    "code": -32600,
+                    "message": f"Invalid Request: line exceeds {_MAX_FRAME_BYTES} bytes"
                 }
-            }
-            print(json.dumps(error_response))
-            sys.stdout.flush()
+            })
+            continue
+        task = asyncio.create_task(_handle_and_write(line))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+    
+    if pending:
+        await asyncio.gather(*pending)
 
 if __name__ == "__main__":
     logger.info("🚀 Calculator MCP Server starting...")
@@ -1,24 +1,43 @@
 import os
-from typing import Dict, Any
+from dataclasses import dataclass, field
+from functools import cached_property
+from types import MappingProxyType
+from typing import Dict, Any, Mapping
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-class Config:
+def _freeze(value: Any) -> Any:
+    """Recursively wrap dicts in read-only views"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    return value
+
+@dataclass(frozen=True)
+class _Config:
     """Configuration class for the LLM Agent"""
     
     # AWS Configuration - Load from environment variables
-    AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID", "")
-    AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY", "")
-    AWS_REGION = os.getenv("AWS_REGION", "ap-northeast-2")
+    AWS_ACCESS_KEY_ID: str = os.getenv("AWS_ACCESS_KEY_ID", "")
+    AWS_SECRET_ACCESS_KEY: str = os.getenv("AWS_SECRET_ACCESS_KEY", "")
+    AWS_REGION: str = os.getenv("AWS_REGION", "ap-northeast-2")
     
     # AWS Bedrock Configuration - Load from environment variables
-    BEDROCK_MODEL_ID = os.getenv("BEDROCK_MODEL_ID", "anthropic.claude-3-5-sonnet-20240620-v1:0")
-    BEDROCK_REGION = os.getenv("BEDROCK_REGION", "ap-northeast-2")
+    BEDROCK_MODEL_ID: str = os.getenv("BEDROCK_MODEL_ID", "anthropic.claude-3-5-sonnet-20240620-v1:0")
+    # Region for bedrock-runtime; defaults to AWS_REGION so setting only that keeps working
+    BEDROCK_REGION: str = os.getenv("BEDROCK_REGION") or os.getenv("AWS_REGION", "ap-northeast-2")
+    BEDROCK_MAX_POOL_CONNECTIONS: int = int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "100"))
+    BEDROCK_MAX_ATTEMPTS: int = int(os.getenv("BEDROCK_MAX_ATTEMPTS", "5"))
+    BEDROCK_PREWARM: bool = os.getenv("BEDROCK_PREWARM", "true").lower() == "true"
+    # Only enable for models that support prompt caching (e.g. Claude 3.5 Sonnet v2, 3.7 Sonnet)
+    BEDROCK_PROMPT_CACHING: bool = os.getenv("BEDROCK_PROMPT_CACHING", "false").lower() == "true"
+    # Only enable for models/regions that offer latency-optimized inference (e.g. Claude 3.5 Haiku in us-east-2);
+    # other models reject the setting with a ValidationException
+    BEDROCK_LATENCY_OPTIMIZED: bool = os.getenv("BEDROCK_LATENCY_OPTIMIZED", "false").lower() == "true"
     
-    # MCP Server Configuration
-    MCP_SERVERS = {
+    # MCP Server Configuration (read-only, shared by every importer)
+    MCP_SERVERS: Mapping[str, Any] = field(default_factory=lambda: _freeze({
         "filesystem": {
             "command": "npx",
             "args": ["-y", "@modelcontextprotocol/server-filesystem", "/home/ubuntu/llm_agent"]
@@ -50,18 +69,31 @@ class Config:
                 "AWS_SECRET_ACCESS_KEY": os.getenv("AWS_SECRET_ACCESS_KEY", "")
             }
         }
-    }
+    }))
     
     # Agent Configuration
-    MAX_ITERATIONS = int(os.getenv("MAX_ITERATIONS", "10"))
-    SUPERVISOR_MODEL = "anthropic.claude-3-5-sonnet-20240620-v1:0"  # Claude 3.5 Sonnet for supervisor
-    WORKER_MODEL = "anthropic.claude-3-5-sonnet-20240620-v1:0"  # Claude 3.5 Sonnet for workers
+    MAX_ITERATIONS: int = int(os.getenv("MAX_ITERATIONS", "10"))
+    HISTORY_WINDOW: int = int(os.getenv("HISTORY_WINDOW", "6"))
+    HISTORY_TOKEN_BUDGET: int = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+    RESPONSE_CACHE_SIZE: int = int(os.getenv("RESPONSE_CACHE_SIZE", "128"))
+    RESPONSE_CACHE_TTL: float = float(os.getenv("RESPONSE_CACHE_TTL", "300"))  # seconds
+    TOOL_RESULT_MAX_CHARS: int = int(os.getenv("TOOL_RESULT_MAX_CHARS", "8000"))
+    MAX_PDF_SIZE: int = int(os.getenv("MAX_PDF_SIZE", str(50 * 1024 * 1024)))  # bytes
+    SUPERVISOR_MODEL: str = "anthropic.claude-3-5-sonnet-20240620-v1:0"  # Claude 3.5 Sonnet for supervisor
+    WORKER_MODEL: str = "anthropic.claude-3-5-sonnet-20240620-v1:0"  # Claude 3.5 Sonnet for workers
+    
+    @cached_property
+    def aws_config(self) -> Mapping[str, str]:
+        """AWS configuration for boto3, built once"""
+        return MappingProxyType({
+            "aws_access_key_id": self.AWS_ACCESS_KEY_ID,
+            "aws_secret_access_key": self.AWS_SECRET_ACCESS_KEY,
+            "region_name": self.AWS_REGION
+        })
     
-    @classmethod
-    def get_aws_config(cls) -> Dict[str, str]:
+    def get_aws_config(self) -> Dict[str, str]:
         """Get AWS configuration for boto3"""
-        return {
-            "aws_access_key_id": cls.AWS_ACCESS_KEY_ID,
-            "aws_secret_access_key": cls.AWS_SECRET_ACCESS_KEY,
-            "region_name": cls.AWS_REGION
-        }
+        return dict(self.aws_config)
+
+# Single read-only configuration instance; attributes are accessed as Config.NAME
+Config = _Config()
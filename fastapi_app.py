@@ -1,37 +1,149 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form
-from fastapi.responses import StreamingResponse, FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, ORJSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
-from typing import List, Dict, Any, AsyncGenerator
+from sse_starlette import EventSourceResponse
+from langchain_core.messages import HumanMessage, AIMessage
+from typing import List, Dict, Any, AsyncGenerator, AsyncIterator, Optional, Tuple
 import asyncio
 import json
+import time
 import uvicorn
 import os
 import logging
-from streaming_agent import StreamingAgent
+import logging.handlers
+import queue
+from streaming_agent import get_streaming_agent
 from config import Config
 from rag_system import RAGSystem
 
+# Production runs skip the reloader, access log and debug-level logging
+IS_PRODUCTION = os.getenv("ENV", "development").lower() == "production"
+
 # Configure logging
+# Request handlers only enqueue log records; a listener thread does the console/file I/O
+# so slow writes never block the event loop
+log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+log_handlers = [
+    logging.StreamHandler(),  # Console output
+    logging.FileHandler('app.log')  # File output
+]
+for log_handler in log_handlers:
+    log_handler.setFormatter(log_formatter)
+
+log_queue = queue.SimpleQueue()
+log_listener = logging.handlers.QueueListener(log_queue, *log_handlers, respect_handler_level=True)
+log_listener.start()
+
 logging.basicConfig(
-    level=logging.DEBUG,  # Change to DEBUG to see more details
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),  # Console output
-        logging.FileHandler('app.log')  # File output
-    ]
+    level=os.getenv("LOG_LEVEL", "WARNING" if IS_PRODUCTION else "INFO").upper(),  # Set LOG_LEVEL=DEBUG to see more details
+    handlers=[logging.handlers.QueueHandler(log_queue)],
+    force=True  # Replace handlers installed by modules imported above
 )
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="LLM Agent API", description="Streaming LLM Agent with Tool Support and RAG")
+# Prefer orjson for SSE frames, fall back to stdlib json
+try:
+    import orjson
+    _dumps = orjson.dumps
+except ImportError:
+    _dumps = lambda obj: json.dumps(obj).encode()
+
+def _sse(payload: Dict[str, Any]) -> bytes:
+    """Encode a payload as a Server-Sent Events data frame"""
+    return b"data: " + _dumps(payload) + b"\n\n"
+
+# EventSourceResponse sets the text/event-stream, cache and proxy-buffering headers itself
+SSE_CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "*",
+    "Access-Control-Allow-Methods": "*"
+}
+SSE_PING_SECONDS = 15
+
+# Updates buffered between the agent/RAG producer and the SSE writer
+STREAM_QUEUE_SIZE = 64
+_STREAM_DONE = object()
+
+async def _produce_updates(updates: AsyncIterator[Dict[str, Any]], queue: asyncio.Queue) -> None:
+    """Pump updates into the queue; a failure is handed to the consumer to re-raise"""
+    try:
+        async for update in updates:
+            await queue.put(update)
+        await queue.put(_STREAM_DONE)
+    except Exception as e:
+        await queue.put(e)
+
+async def buffered_updates(updates: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    """Run the update producer as its own task so a slow client and a slow LLM don't stall each other"""
+    queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+    producer = asyncio.create_task(_produce_updates(updates, queue))
+    try:
+        while (item := await queue.get()) is not _STREAM_DONE:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Client went away or the stream ended: stop generating (and paying for) tokens
+        producer.cancel()
+
+# Handlers on hot paths return ORJSONResponse directly to skip the jsonable_encoder pass
+app = FastAPI(
+    title="LLM Agent API",
+    description="Streaming LLM Agent with Tool Support and RAG",
+    default_response_class=ORJSONResponse
+)
+
+# Compress larger JSON/HTML bodies; text/event-stream responses are left uncompressed
+# by the middleware so SSE tokens still flush one by one
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+PDF_UPLOAD_PATHS = frozenset({"/rag/upload", "/chat/upload"})
+PDF_MAGIC = b"%PDF-"
+# Room for the multipart boundaries and form headers around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+class PdfUploadSizeLimitMiddleware:
+    """Reject oversized PDF uploads from Content-Length before the multipart body is read"""
+    
+    def __init__(self, app, max_size: int):
+        self.app = app
+        self.max_size = max_size
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in PDF_UPLOAD_PATHS:
+            content_length = dict(scope["headers"]).get(b"content-length", b"")
+            if content_length.isdigit() and int(content_length) > self.max_size + MULTIPART_OVERHEAD:
+                response = ORJSONResponse(
+                    {"detail": f"PDF exceeds the {self.max_size // (1024 * 1024)} MB upload limit"},
+                    status_code=413
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+app.add_middleware(PdfUploadSizeLimitMiddleware, max_size=Config.MAX_PDF_SIZE)
+
+def check_pdf_upload(file: UploadFile) -> Optional[Tuple[int, str]]:
+    """Return (status_code, error) if the upload is not an acceptable PDF, else None"""
+    if not file.filename.endswith('.pdf'):
+        return 400, "Only PDF files are allowed"
+    if file.size is not None and file.size > Config.MAX_PDF_SIZE:
+        return 413, f"PDF exceeds the {Config.MAX_PDF_SIZE // (1024 * 1024)} MB upload limit"
+    # Check the magic bytes so non-PDF blobs never reach the parser
+    header = file.file.read(len(PDF_MAGIC))
+    file.file.seek(0)
+    if header != PDF_MAGIC:
+        return 400, "File is not a valid PDF"
+    return None
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# Templates
-templates = Jinja2Templates(directory="templates")
+# Page templates have no template variables; serve them as static files
+TEMPLATES_DIR = "templates"
 
 # Global instances
 agent = None
@@ -45,18 +157,38 @@ class ChatResponse(BaseModel):
     message: str
     used_tools: bool = False
 
+# Client conversation role -> LangChain message class
+_ROLE_MESSAGE_TYPES = {
+    "user": HumanMessage,
+    "assistant": AIMessage
+}
+
+def to_langchain_history(conversation_history: List[Dict[str, str]]) -> list:
+    """Convert client conversation history to LangChain messages, skipping unknown roles"""
+    # The agent only keeps the last HISTORY_WINDOW messages, so don't convert older ones
+    window = Config.HISTORY_WINDOW
+    recent = conversation_history[-window:] if window > 0 else []
+    return [
+        _ROLE_MESSAGE_TYPES[msg["role"]](content=msg["content"])
+        for msg in recent
+        if msg.get("role") in _ROLE_MESSAGE_TYPES
+    ]
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize the agent and RAG system on startup"""
     global agent, rag_system
     try:
         logger.info("✅ Initializing ChatBedrock...")
-        logger.info("✅ AWS credentials verified")
-        agent = StreamingAgent()
+        agent = get_streaming_agent()
+        # Connect to MCP servers while the rest of startup continues, not on the first chat request
+        agent.prefetch_tools()
         logger.info("🚀 Agent initialized successfully")
         
+        # RAGSystem setup (Bedrock clients, ChromaDB load) is blocking; run it in a thread
+        # so the MCP prefetch keeps making progress on the event loop meanwhile
         logger.info("✅ Initializing RAG System...")
-        rag_system = RAGSystem()
+        rag_system = await asyncio.to_thread(RAGSystem)
         logger.info("🚀 RAG System initialized successfully")
     except Exception as e:
         logger.error(f"❌ Failed to initialize systems: {e}")
@@ -68,66 +200,61 @@ async def shutdown_event():
     global agent
     if agent:
         await agent.close()
+    log_listener.stop()
 
-async def stream_agent_response(message: str, conversation_history: List[Dict[str, str]] = None) -> AsyncGenerator[str, None]:
+async def stream_agent_response(message: str, conversation_history: List[Dict[str, str]] = None) -> AsyncGenerator[bytes, None]:
     """Stream agent response as Server-Sent Events"""
     logger.info(f"📨 Received message: {message[:100]}...")
     
     if not agent:
         logger.error("❌ Agent not initialized")
-        yield f"data: {json.dumps({'type': 'error', 'message': 'Agent not initialized'})}\n\n"
+        yield _sse({'type': 'error', 'message': 'Agent not initialized'})
         return
     
     try:
         # Convert conversation history to proper format
-        from langchain_core.messages import HumanMessage, AIMessage
         history = []
         if conversation_history:
             logger.info(f"📚 Processing {len(conversation_history)} conversation history items")
-            for msg in conversation_history:
-                if msg.get("role") == "user":
-                    history.append(HumanMessage(content=msg["content"]))
-                elif msg.get("role") == "assistant":
-                    history.append(AIMessage(content=msg["content"]))
+            history = to_langchain_history(conversation_history)
         
         # Stream the agent response
         logger.info("🚀 Starting agent streaming...")
-        async for update in agent.run_streaming(message, history):
-            logger.debug(f"📤 Streaming update: {update['type']}")
+        async for update in buffered_updates(agent.run_streaming(message, history)):
+            logger.debug("📤 Streaming update: %s", update["type"])
             
             if update["type"] == "step":
-                yield f"data: {json.dumps({'type': 'step', 'message': update['message'], 'details': update.get('details', '')})}\n\n"
+                yield _sse({'type': 'step', 'message': update['message'], 'details': update.get('details', '')})
             elif update["type"] == "stream":
-                yield f"data: {json.dumps({'type': 'stream', 'chunk': update['chunk']})}\n\n"
+                yield _sse({'type': 'stream', 'chunk': update['chunk']})
+            elif update["type"] == "stream_discard":
+                yield _sse({'type': 'stream_discard'})
             elif update["type"] == "tool_result":
                 logger.info(f"🔧 Tool result: {update.get('tool_name', 'Unknown')}")
-                yield f"data: {json.dumps({'type': 'tool_result', 'tool_name': update.get('tool_name', 'Unknown'), 'result': update.get('result', '')})}\n\n"
+                yield _sse({'type': 'tool_result', 'tool_name': update.get('tool_name', 'Unknown'), 'result': update.get('result', '')})
             elif update["type"] == "response" or update["type"] == "response_complete":
                 logger.info(f"✅ Response complete, used_tools: {update.get('used_tools', False)}")
                 # Don't send the full message again, just the completion signal
-                yield f"data: {json.dumps({'type': 'response_complete', 'used_tools': update.get('used_tools', False)})}\n\n"
+                yield _sse({'type': 'response_complete', 'used_tools': update.get('used_tools', False)})
             elif update["type"] == "error":
                 logger.error(f"❌ Agent error: {update['message']}")
-                yield f"data: {json.dumps({'type': 'error', 'message': update['message']})}\n\n"
-            
-            # Small delay to prevent overwhelming the client
-            await asyncio.sleep(0.01)
+                yield _sse({'type': 'error', 'message': update['message']})
         
         logger.info("🏁 Agent streaming completed")
     
     except Exception as e:
         logger.error(f"❌ Streaming error: {str(e)}")
-        yield f"data: {json.dumps({'type': 'error', 'message': f'Error: {str(e)}'})}\n\n"
+        yield _sse({'type': 'error', 'message': f'Error: {str(e)}'})
 
 @app.get("/")
 async def root():
     """Serve the main interface with navigation"""
-    return templates.TemplateResponse("main.html", {"request": {}})
+    return FileResponse(os.path.join(TEMPLATES_DIR, "main.html"), media_type="text/html")
 
 @app.get("/api")
 async def api_info():
     """API information endpoint"""
-    return {
+    return ORJSONResponse({
         "message": "LLM Agent API",
         "version": "1.0.0",
         "endpoints": {
@@ -136,30 +263,24 @@ async def api_info():
             "GET /health": "Health check",
             "GET /docs": "API documentation"
         }
-    }
+    })
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {
+    return ORJSONResponse({
         "status": "healthy",
         "agent_initialized": agent is not None,
-        "timestamp": asyncio.get_event_loop().time()
-    }
+        "timestamp": time.monotonic()
+    })
 
 @app.post("/chat")
 async def chat_stream(request: ChatRequest):
     """Streaming chat endpoint using Server-Sent Events"""
-    return StreamingResponse(
+    return EventSourceResponse(
         stream_agent_response(request.message, request.conversation_history),
-        media_type="text/plain",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "*",
-            "Access-Control-Allow-Methods": "*"
-        }
+        ping=SSE_PING_SECONDS,
+        headers=SSE_CORS_HEADERS
     )
 
 @app.post("/chat/simple")
@@ -170,14 +291,7 @@ async def chat_simple(request: ChatRequest):
     
     try:
         # Convert conversation history
-        from langchain_core.messages import HumanMessage, AIMessage
-        history = []
-        if request.conversation_history:
-            for msg in request.conversation_history:
-                if msg.get("role") == "user":
-                    history.append(HumanMessage(content=msg["content"]))
-                elif msg.get("role") == "assistant":
-                    history.append(AIMessage(content=msg["content"]))
+        history = to_langchain_history(request.conversation_history or [])
         
         # Collect all updates
         final_response = ""
@@ -190,7 +304,7 @@ async def chat_simple(request: ChatRequest):
             elif update["type"] == "error":
                 raise HTTPException(status_code=500, detail=update["message"])
         
-        return ChatResponse(message=final_response, used_tools=used_tools)
+        return ORJSONResponse(ChatResponse(message=final_response, used_tools=used_tools).model_dump())
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -199,7 +313,7 @@ async def chat_simple(request: ChatRequest):
 @app.get("/rag")
 async def rag_interface():
     """Serve the RAG interface"""
-    return templates.TemplateResponse("rag.html", {"request": {}})
+    return FileResponse(os.path.join(TEMPLATES_DIR, "rag.html"), media_type="text/html")
 
 @app.post("/rag/upload")
 async def upload_pdf(file: UploadFile = File(...)):
@@ -207,17 +321,21 @@ async def upload_pdf(file: UploadFile = File(...)):
     if not rag_system:
         raise HTTPException(status_code=500, detail="RAG system not initialized")
     
-    if not file.filename.endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+    upload_error = check_pdf_upload(file)
+    if upload_error:
+        status_code, detail = upload_error
+        raise HTTPException(status_code=status_code, detail=detail)
     
     try:
-        # Read file content
-        content = await file.read()
-        
-        # Process PDF using bytes method
-        result = rag_system.process_pdf_bytes(content, file.filename)
+        # The upload is already spooled by Starlette (RAM up to 1 MB, then disk); copy it
+        # to the parser in chunks and parse, chunk and embed in a worker thread so
+        # streaming responses keep flowing
+        result = await asyncio.to_thread(rag_system.process_pdf_fileobj, file.file, file.filename)
         
         if result.get("success", False):
+            # Cached answers predate the new document
+            if agent:
+                agent.clear_response_cache()
             return {
                 "message": result.get("message", f"PDF '{file.filename}' processed successfully"),
                 "chunks_created": result.get("chunks_created", 0),
@@ -237,11 +355,11 @@ async def search_documents(query: str = Form(...), k: int = Form(5)):
         raise HTTPException(status_code=500, detail="RAG system not initialized")
     
     try:
-        results = await rag_system.search(query, n_results=k)
-        return {
+        results = await asyncio.to_thread(rag_system.search, query, n_results=k)
+        return ORJSONResponse({
             "query": query,
             "results": results
-        }
+        })
     except Exception as e:
         logger.error(f"Error searching documents: {e}")
         raise HTTPException(status_code=500, detail=f"Error searching documents: {str(e)}")
@@ -254,7 +372,7 @@ async def get_collection_info():
     
     try:
         info = rag_system.get_collection_info()
-        return info
+        return ORJSONResponse(info)
     except Exception as e:
         logger.error(f"Error getting collection info: {e}")
         raise HTTPException(status_code=500, detail=f"Error getting collection info: {str(e)}")
@@ -279,85 +397,77 @@ async def rag_chat(query: str = Form(...), n_results: int = Form(3)):
         raise HTTPException(status_code=500, detail="RAG system not initialized")
     
     try:
-        result = await rag_system.rag_chat(query, n_results=n_results)
-        return result
+        result = await asyncio.to_thread(rag_system.rag_chat, query, n_results=n_results)
+        return ORJSONResponse(result)
     except Exception as e:
         logger.error(f"Error in RAG chat: {e}")
         raise HTTPException(status_code=500, detail=f"Error in RAG chat: {str(e)}")
 
-async def stream_rag_response(query: str, n_results: int = 3) -> AsyncGenerator[str, None]:
+async def stream_rag_response(query: str, n_results: int = 3) -> AsyncGenerator[bytes, None]:
     """Stream RAG response as Server-Sent Events"""
     logger.info(f"📨 RAG streaming request: {query[:100]}...")
     
     if not rag_system:
         logger.error("❌ RAG system not initialized")
-        yield f"data: {json.dumps({'type': 'error', 'message': 'RAG system not initialized'})}\n\n"
+        yield _sse({'type': 'error', 'message': 'RAG system not initialized'})
         return
     
     try:
         # Stream the RAG response
         logger.info("🚀 Starting RAG streaming...")
-        async for update in rag_system.rag_chat_stream(query, n_results=n_results):
-            logger.debug(f"📤 RAG streaming update: {update['type']}")
+        async for update in buffered_updates(rag_system.rag_chat_stream(query, n_results=n_results)):
+            logger.debug("📤 RAG streaming update: %s", update["type"])
             
             if update["type"] == "search_start":
-                yield f"data: {json.dumps({'type': 'search_start', 'message': update['message']})}\n\n"
+                yield _sse({'type': 'search_start', 'message': update['message']})
             elif update["type"] == "search_complete":
-                yield f"data: {json.dumps({'type': 'search_complete', 'message': update['message'], 'sources': update.get('sources', [])})}\n\n"
+                yield _sse({'type': 'search_complete', 'message': update['message'], 'sources': update.get('sources', [])})
             elif update["type"] == "generation_start":
-                yield f"data: {json.dumps({'type': 'generation_start', 'message': update['message']})}\n\n"
+                yield _sse({'type': 'generation_start', 'message': update['message']})
             elif update["type"] == "stream":
-                yield f"data: {json.dumps({'type': 'stream', 'chunk': update['chunk']})}\n\n"
+                yield _sse({'type': 'stream', 'chunk': update['chunk']})
             elif update["type"] == "response_complete":
                 logger.info("✅ RAG response complete")
-                yield f"data: {json.dumps({'type': 'response_complete', 'message': update['message'], 'sources': update.get('sources', []), 'query': update.get('query', ''), 'total_sources': update.get('total_sources', 0)})}\n\n"
+                yield _sse({'type': 'response_complete', 'message': update['message'], 'sources': update.get('sources', []), 'query': update.get('query', ''), 'total_sources': update.get('total_sources', 0)})
             elif update["type"] == "error":
                 logger.error(f"❌ RAG error: {update['message']}")
-                yield f"data: {json.dumps({'type': 'error', 'message': update['message']})}\n\n"
-            
-            # Small delay to prevent overwhelming the client
-            await asyncio.sleep(0.01)
+                yield _sse({'type': 'error', 'message': update['message']})
         
         logger.info("🏁 RAG streaming completed")
     
     except Exception as e:
         logger.error(f"❌ RAG streaming error: {str(e)}")
-        yield f"data: {json.dumps({'type': 'error', 'message': f'Error: {str(e)}'})}\n\n"
+        yield _sse({'type': 'error', 'message': f'Error: {str(e)}'})
 
 @app.post("/rag/chat/stream")
 async def rag_chat_stream(query: str = Form(...), n_results: int = Form(3)):
     """RAG 기반 스트리밍 채팅 - 검색된 문서를 참조하여 LLM이 스트리밍으로 답변 생성"""
-    return StreamingResponse(
+    return EventSourceResponse(
         stream_rag_response(query, n_results),
-        media_type="text/plain",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "*",
-            "Access-Control-Allow-Methods": "*"
-        }
+        ping=SSE_PING_SECONDS,
+        headers=SSE_CORS_HEADERS
     )
 
 # Agent Chat with File Upload
 @app.post("/chat/upload")
 async def chat_upload_file(file: UploadFile = File(...)):
     """Upload PDF file for Agent chat - integrates with RAG MCP"""
-    if not file.filename.endswith('.pdf'):
+    upload_error = check_pdf_upload(file)
+    if upload_error:
         return {
             "success": False,
-            "error": "Only PDF files are allowed"
+            "error": upload_error[1]
         }
     
     try:
-        # Read file content
-        content = await file.read()
-        
-        # Process PDF using RAG system
+        # Process PDF using RAG system, streaming from the spooled upload
         if rag_system:
-            result = rag_system.process_pdf_bytes(content, file.filename)
+            result = await asyncio.to_thread(rag_system.process_pdf_fileobj, file.file, file.filename)
             
             if result.get("success", False):
+                # Cached answers predate the new document
+                if agent:
+                    agent.clear_response_cache()
                 return {
                     "success": True,
                     "message": f"PDF '{file.filename}' uploaded and processed successfully",
@@ -389,8 +499,10 @@ if __name__ == "__main__":
         "fastapi_app:app",
         host="0.0.0.0",
         port=8001,
-        reload=True,
-        log_level="info",
-        access_log=True,
+        loop="uvloop",
+        http="httptools",
+        reload=not IS_PRODUCTION,
+        log_level="warning" if IS_PRODUCTION else "info",
+        access_log=not IS_PRODUCTION,
         use_colors=True
     )
@@ -0,0 +1,25 @@
+"""
+Gunicorn settings for production: `gunicorn fastapi_app:app`
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8001")
+
+# One event loop per core; every worker runs its own agent, MCP servers and RAG system,
+# so the default stays at the core count rather than 2 * cores + 1
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# The app is imported in each worker, not preloaded in the master: fastapi_app starts its
+# log listener thread at import time and threads do not survive fork
+preload_app = False
+
+# SSE responses stay open for the whole LLM generation
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "300"))
+graceful_timeout = 30
+keepalive = 5
+
+raw_env = ["ENV=production"]
+accesslog = None
@@ -1,12 +1,28 @@
 import asyncio
 import json
+import logging
 import subprocess
 import os
+import sys
+import threading
+import time
 from typing import Dict, List, Any, Optional
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 from config import Config
 
+logger = logging.getLogger(__name__)
+
+# Prefer orjson for parsing MCP responses, fall back to stdlib json
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+class RequestNotSentError(ConnectionError):
+    """The tool call never reached the MCP server, so sending it again cannot run it twice"""
+
 class McpClientManager:
     """Manager for multiple MCP servers with additional functionality"""
     
@@ -14,13 +30,15 @@ class McpClientManager:
         self.sessions: Dict[str, ClientSession] = {}
         self.tools: Dict[str, List[Dict[str, Any]]] = {}
         self.initialized = False
+        self._sync_locks: Dict[str, threading.Lock] = {}
+        self._session_locks: Dict[str, asyncio.Lock] = {}
     
     async def initialize(self):
         """Initialize all MCP servers"""
         if self.initialized:
             return
             
-        print(f"🚀 Initializing MCP servers...")
+        logger.info("🚀 Initializing MCP servers...")
         
         # Connect to servers in parallel for faster initialization
         tasks = []
@@ -34,12 +52,12 @@ class McpClientManager:
                 for server_name, task in tasks:
                     try:
                         await task
-                        print(f"✅ Connected to MCP server: {server_name}")
+                        logger.info("✅ Connected to MCP server: %s", server_name)
                     except Exception as e:
-                        print(f"❌ Failed to connect to MCP server {server_name}: {e}")
+                        logger.error("❌ Failed to connect to MCP server %s: %s", server_name, e)
                         # Continue with other servers instead of failing completely
         except asyncio.TimeoutError:
-            print("❌ MCP server initialization timeout")
+            logger.error("❌ MCP server initialization timeout")
             # Cancel remaining tasks
             for server_name, task in tasks:
                 if not task.done():
@@ -48,10 +66,10 @@ class McpClientManager:
         
         self.initialized = True
         connected_servers = len([s for s in self.sessions.values() if s is not None])
-        print(f"🚀 McpClientManager initialized with {connected_servers} connected servers out of {len(Config.MCP_SERVERS)} configured")
+        logger.info("🚀 McpClientManager initialized with %s connected servers out of %s configured", connected_servers, len(Config.MCP_SERVERS))
         
         if connected_servers == 0:
-            print("⚠️  No MCP servers connected. Tool functionality will be limited.")
+            logger.warning("⚠️  No MCP servers connected. Tool functionality will be limited.")
     
     async def _connect_server(self, server_name: str, server_config: Dict[str, Any]):
         """Connect to a single MCP server"""
@@ -59,7 +77,7 @@ class McpClientManager:
             # Check if the command exists
             command = server_config["command"]
             if not self._command_exists(command):
-                print(f"❌ Command '{command}' not found for {server_name}")
+                logger.error("❌ Command '%s' not found for %s", command, server_name)
                 return  # Skip this server instead of raising error
             
             # Connect to real MCP server
@@ -80,9 +98,6 @@ class McpClientManager:
             try:
                 # Connect to the real MCP server with timeout
                 async with asyncio.timeout(5.0):  # 5 second timeout
-                    # Use a simpler approach to avoid TaskGroup issues
-                    import subprocess
-                    
                     # Start the MCP server process
                     process = await asyncio.create_subprocess_exec(
                         server_config["command"],
@@ -107,7 +122,8 @@ class McpClientManager:
                             
                             # Read response
                             response = await self.process.stdout.readline()
-                            print(f"🔍 MCP server {server_name} init response: {response.decode().strip()}")
+                            if logger.isEnabledFor(logging.DEBUG):
+                                logger.debug("🔍 MCP server %s init response: %s", server_name, response.decode().strip())
                         
                         async def list_tools(self):
                             # Send list_tools message
@@ -117,21 +133,21 @@ class McpClientManager:
                             
                             # Read response
                             response = await self.process.stdout.readline()
-                            print(f"🔍 MCP server {server_name} tools response: {response.decode().strip()}")
+                            if logger.isEnabledFor(logging.DEBUG):
+                                logger.debug("🔍 MCP server %s tools response: %s", server_name, response.decode().strip())
                             
                             # Parse tools (simplified)
-                            import json
                             try:
-                                data = json.loads(response.decode())
-                                print(f"🔍 Parsed JSON data: {data}")
+                                data = _loads(response)
+                                logger.debug("🔍 Parsed JSON data: %s", data)
                                 if "result" in data and "tools" in data["result"]:
                                     self.tools = data["result"]["tools"]
-                                    print(f"🔍 Successfully parsed {len(self.tools)} tools for {server_name}")
+                                    logger.debug("🔍 Successfully parsed %s tools for %s", len(self.tools), server_name)
                                     return type('obj', (object,), {'tools': self.tools})()
                                 else:
-                                    print(f"🔍 No tools found in response for {server_name}")
+                                    logger.debug("🔍 No tools found in response for %s", server_name)
                             except Exception as e:
-                                print(f"🔍 Error parsing tools response for {server_name}: {e}")
+                                logger.debug("🔍 Error parsing tools response for %s: %s", server_name, e)
                                 pass
                             
                             # Fallback tools based on server name
@@ -167,7 +183,7 @@ class McpClientManager:
                             return type('obj', (object,), {'tools': self.tools})()
                         
                         async def call_tool(self, tool_name, arguments):
-                            print(f"🔍 call_tool called with tool_name: {tool_name}, arguments: {arguments}")
+                            logger.debug("🔍 call_tool called with tool_name: %s, arguments: %s", tool_name, arguments)
                             
                             # Add default arguments for common tools
                             if tool_name == "list_directory" and "path" not in arguments:
@@ -175,28 +191,31 @@ class McpClientManager:
                             elif tool_name == "read_file" and "path" not in arguments:
                                 arguments["path"] = "README.md"  # Default file
                             
-                            print(f"🔍 Final arguments: {arguments}")
+                            logger.debug("🔍 Final arguments: %s", arguments)
                             
                             # Generate unique request ID
-                            import time
                             request_id = int(time.time() * 1000) % 100000
                             
                             # Send tool call message
                             tool_call_msg = f'{{"jsonrpc": "2.0", "id": {request_id}, "method": "tools/call", "params": {{"name": "{tool_name}", "arguments": {json.dumps(arguments)}}}}}\n'
-                            print(f"🔍 Tool call message: {tool_call_msg.strip()}")
+                            if logger.isEnabledFor(logging.DEBUG):
+                                logger.debug("🔍 Tool call message: %s", tool_call_msg.strip())
                             
-                            self.process.stdin.write(tool_call_msg.encode())
-                            await self.process.stdin.drain()
+                            try:
+                                self.process.stdin.write(tool_call_msg.encode())
+                                await self.process.stdin.drain()
+                            except (ConnectionError, OSError) as e:
+                                raise RequestNotSentError(f"Failed to send {tool_name} to {server_name}: {e}") from e
                             
                             # Read responses until we get the one with matching ID
                             max_attempts = 10
                             for attempt in range(max_attempts):
                                 response = await self.process.stdout.readline()
                                 response_text = response.decode().strip()
-                                print(f"🔍 MCP server {server_name} tool call response (attempt {attempt+1}): {response_text}")
+                                logger.debug("🔍 MCP server %s tool call response (attempt %s): %s", server_name, attempt+1, response_text)
                                 
                                 try:
-                                    data = json.loads(response_text)
+                                    data = _loads(response_text)
                                     response_id = data.get("id")
                                     
                                     # Check if this is the response we're waiting for
@@ -208,14 +227,22 @@ class McpClientManager:
                                         else:
                                             return str(data.get("result", ""))
                                     else:
-                                        print(f"⚠️ Skipping response with mismatched ID: expected {request_id}, got {response_id}")
+                                        logger.warning("⚠️ Skipping response with mismatched ID: expected %s, got %s", request_id, response_id)
                                         continue
                                 except Exception as e:
-                                    print(f"❌ Error parsing tool response: {e}")
+                                    logger.error("❌ Error parsing tool response: %s", e)
                                     continue
                             
                             return f"Tool {tool_name} executed with arguments {arguments}"
                         
+                        async def close(self):
+                            # Stop the server process so it doesn't outlive the client
+                            if self.process.returncode is None:
+                                self.process.terminate()
+                                try:
+                                    await asyncio.wait_for(self.process.wait(), timeout=5.0)
+                                except asyncio.TimeoutError:
+                                    self.process.kill()
                     
                     session = SimpleSession(process)
                     await session.initialize()
@@ -228,18 +255,18 @@ class McpClientManager:
                     self.tools[server_name] = tools_result.tools
                     
                     self.sessions[server_name] = session
-                    print(f"✅ Connected to real MCP server: {server_name}")
+                    logger.info("✅ Connected to real MCP server: %s", server_name)
                     return
                         
             except asyncio.TimeoutError:
-                print(f"❌ Timeout connecting to MCP server {server_name}")
+                logger.error("❌ Timeout connecting to MCP server %s", server_name)
                 return  # Skip this server instead of raising error
             except Exception as e:
-                print(f"❌ Failed to connect to MCP server {server_name}: {e}")
+                logger.error("❌ Failed to connect to MCP server %s: %s", server_name, e)
                 return  # Skip this server instead of raising error
                 
         except Exception as e:
-            print(f"❌ Error setting up MCP server {server_name}: {e}")
+            logger.error("❌ Error setting up MCP server %s: %s", server_name, e)
             return  # Skip this server instead of raising error
     
     def _command_exists(self, command: str) -> bool:
@@ -267,7 +294,7 @@ class McpClientManager:
             conn.close()
             return True
         except Exception as e:
-            print(f"⚠️  PostgreSQL connection test failed: {e}")
+            logger.warning("⚠️  PostgreSQL connection test failed: %s", e)
             return False
     
     
@@ -295,30 +322,61 @@ class McpClientManager:
                 "tool": tool_name
                 }
         
-        # Use real MCP server
-        try:
-            # Call the actual tool on the MCP server
-            result = await session.call_tool(tool_name, arguments)
-            return {
-                "success": True,
-                "result": result.content if hasattr(result, 'content') else result,
-                "server": server_name,
-                "tool": tool_name,
-                "mode": "real"
-            }
-        except Exception as e:
-            print(f"❌ Real MCP tool call failed for {server_name}.{tool_name}: {e}")
-            return {
-                "success": False,
-                "error": f"Tool call failed: {str(e)}",
-                "server": server_name,
-                "tool": tool_name
-            }
+        # Use real MCP server. A call that failed before it reached the server is retried
+        # once here, so it never costs an extra LLM round-trip to recover from. Timeouts and
+        # EOF after sending are not retried: the server may already have run the call
+        lock = self._session_locks.setdefault(server_name, asyncio.Lock())
+        for attempt in range(2):
+            try:
+                # A session reads responses off one stdio pipe, so calls to the same server
+                # take turns while calls to different servers run concurrently
+                async with lock:
+                    session = await self._ensure_session_alive(server_name, self.sessions.get(server_name) or session)
+                    # Call the actual tool on the MCP server
+                    result = await session.call_tool(tool_name, arguments)
+                return {
+                    "success": True,
+                    "result": result.content if hasattr(result, 'content') else result,
+                    "server": server_name,
+                    "tool": tool_name,
+                    "mode": "real"
+                }
+            except Exception as e:
+                retryable = isinstance(e, RequestNotSentError)
+                if retryable and attempt == 0:
+                    logger.warning("🔄 Retrying %s.%s after transient error: %r", server_name, tool_name, e)
+                    continue
+                logger.error("❌ Real MCP tool call failed for %s.%s: %r", server_name, tool_name, e)
+                return {
+                    "success": False,
+                    "error": f"Tool call failed ({type(e).__name__}): {str(e)[:500]}",
+                    "error_type": type(e).__name__,
+                    "retryable": retryable,
+                    "server": server_name,
+                    "tool": tool_name
+                }
+    
+    async def _ensure_session_alive(self, server_name: str, session):
+        """Respawn a server whose process has exited, reusing the live session otherwise"""
+        process = getattr(session, "process", None)
+        if process is None or process.returncode is None:
+            return session
+        
+        logger.warning("🔄 MCP server %s exited (code %s), reconnecting...", server_name, process.returncode)
+        # The dead session stays registered until a respawn succeeds, so a failed
+        # attempt is retried on the next call instead of reporting "not connected"
+        await self._connect_server(server_name, Config.MCP_SERVERS[server_name])
+        new_session = self.sessions.get(server_name)
+        if new_session is None or new_session is session:
+            self.sessions[server_name] = session
+            raise RuntimeError(f"Failed to reconnect to MCP server {server_name}")
+        
+        # The respawned server may advertise a different tool list
+        self.tools[server_name] = new_session.tools
+        return new_session
     
     def _get_server_script_path(self, server_name: str) -> str:
         """Get the script path for a given server name"""
-        import os
-        
         # Base directory for MCP servers
         base_dir = "/home/ubuntu/llm_agent"
         
@@ -341,6 +399,15 @@ class McpClientManager:
     
     def call_tool_sync(self, server_name: str, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
         """Synchronous version of call_tool for use in sync contexts"""
+        # Sync callers may run concurrently in executor threads. Calls to the
+        # same server share one stdio pipe, so serialize them per server while
+        # calls to different servers still run in parallel.
+        lock = self._sync_locks.setdefault(server_name, threading.Lock())
+        with lock:
+            return self._call_tool_sync_unlocked(server_name, tool_name, arguments)
+    
+    def _call_tool_sync_unlocked(self, server_name: str, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Send a tool call over the server's persistent stdio pipe and wait for its response"""
         if not self.initialized:
             raise RuntimeError("McpClientManager not initialized")
         
@@ -365,7 +432,7 @@ class McpClientManager:
         
         # Use real MCP server with synchronous call
         try:
-            print(f"🔍 call_tool_sync called with tool_name: {tool_name}, arguments: {arguments}")
+            logger.debug("🔍 call_tool_sync called with tool_name: %s, arguments: %s", tool_name, arguments)
             
             # Add default arguments for common tools
             if tool_name == "list_directory" and "path" not in arguments:
@@ -373,21 +440,17 @@ class McpClientManager:
             elif tool_name == "read_file" and "path" not in arguments:
                 arguments["path"] = "README.md"  # Default file
             
-            print(f"🔍 Final arguments: {arguments}")
+            logger.debug("🔍 Final arguments: %s", arguments)
             
             # Generate unique request ID
-            import time
             request_id = int(time.time() * 1000) % 100000
             
             # Send tool call message
             tool_call_msg = f'{{"jsonrpc": "2.0", "id": {request_id}, "method": "tools/call", "params": {{"name": "{tool_name}", "arguments": {json.dumps(arguments)}}}}}\n'
-            print(f"🔍 Tool call message: {tool_call_msg.strip()}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("🔍 Tool call message: %s", tool_call_msg.strip())
             
             # Use subprocess to avoid asyncio conflicts
-            import subprocess
-            import os
-            import sys
-            
             # Check if we have a persistent MCP server process for this server
             process_key = f'_mcp_process_{server_name}'
             if not hasattr(self, process_key) or getattr(self, process_key).poll() is not None:
@@ -405,7 +468,6 @@ class McpClientManager:
                     }
                 
                 # Set server-specific environment variables
-                from config import Config
                 if server_name == "postgres":
                     env["POSTGRES_CONNECTION_STRING"] = Config.MCP_SERVERS["postgres"]["env"]["POSTGRES_CONNECTION_STRING"]
                 elif server_name == "mysql":
@@ -436,11 +498,11 @@ class McpClientManager:
                         break
                     
                     line = line.strip()
-                    print(f"🔍 MCP server {server_name} tool call response (attempt {attempt+1}): {line}")
+                    logger.debug("🔍 MCP server %s tool call response (attempt %s): %s", server_name, attempt+1, line)
                     
                     # Parse response
                     try:
-                        data = json.loads(line)
+                        data = _loads(line)
                         response_id = data.get("id")
                         
                         # Check if this is the response we're waiting for
@@ -460,13 +522,13 @@ class McpClientManager:
                                 "mode": "real"
                             }
                         else:
-                            print(f"⚠️ Skipping response with mismatched ID: expected {request_id}, got {response_id}")
+                            logger.warning("⚠️ Skipping response with mismatched ID: expected %s, got %s", request_id, response_id)
                             continue
                     except json.JSONDecodeError:
                         # Skip non-JSON lines (debug logs)
                         continue
                 except Exception as e:
-                    print(f"❌ Error reading response: {e}")
+                    logger.error("❌ Error reading response: %s", e)
                     break
             
             if mcp_process.poll() is not None:
@@ -495,7 +557,7 @@ class McpClientManager:
                 "tool": tool_name
             }
         except Exception as e:
-            print(f"❌ Real MCP tool call failed for {server_name}.{tool_name}: {e}")
+            logger.error("❌ Real MCP tool call failed for %s.%s: %s", server_name, tool_name, e)
             return {
                 "success": False,
                 "error": f"Tool call failed: {str(e)}",
@@ -584,12 +646,20 @@ class McpClientManager:
             if session is not None:
                 try:
                     await session.close()
-                    print(f"🔌 Closed connection to MCP server: {server_name}")
+                    logger.info("🔌 Closed connection to MCP server: %s", server_name)
                 except Exception as e:
-                    print(f"⚠️  Error closing MCP server {server_name}: {e}")
+                    logger.warning("⚠️  Error closing MCP server %s: %s", server_name, e)
         
         self.sessions.clear()
         self.tools.clear()
+        
+        # Stop the persistent processes used by call_tool_sync
+        for attr in [name for name in vars(self) if name.startswith('_mcp_process_')]:
+            process = getattr(self, attr)
+            if process.poll() is None:
+                process.terminate()
+            delattr(self, attr)
+        
         self.initialized = False
 
 # Global instance
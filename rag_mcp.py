@@ -8,7 +8,7 @@ import asyncio
 import json
 import sys
 import logging
-import base64
+import numpy as np
 from typing import List, Dict, Any, Optional
 
 # Import RAGSystem from rag_system.py
@@ -188,11 +188,8 @@ async def upload_pdf(pdf_data: str, filename: str, metadata: dict = None) -> str
         if not pdf_data or not filename:
             return "❌ PDF 데이터와 파일명이 필요합니다."
         
-        # Decode base64 PDF data
-        pdf_bytes = base64.b64decode(pdf_data)
-        
-        # Process PDF
-        result = rag_system.process_pdf_bytes(pdf_bytes, filename, metadata)
+        # Base64를 청크 단위로 디코딩하며 바로 임시 파일에 기록
+        result = rag_system.process_pdf_base64(pdf_data, filename, metadata)
         
         if result["success"]:
             return f"✅ PDF '{filename}' 업로드 및 처리 완료!\n" \
@@ -217,16 +214,20 @@ async def search_documents(query: str, n_results: int = 5) -> str:
         if not results:
             return f"🔍 '{query}'에 대한 검색 결과가 없습니다."
         
-        response = f"🔍 '{query}' 검색 결과 ({len(results)}개):\n\n"
+        # 코사인 거리 -> 유사도 변환을 한 번에 계산
+        distances = np.fromiter((result['distance'] for result in results), dtype=np.float64, count=len(results))
+        similarities = 1.0 - distances
         
-        for i, result in enumerate(results, 1):
-            response += f"**결과 {i}:**\n"
-            metadata = result.get('metadata', {})
-            response += f"문서: {metadata.get('filename', 'Unknown')}\n"
-            response += f"내용: {result['text'][:200]}...\n"
-            response += f"유사도: {1 - result['distance']:.3f}\n\n"
+        parts = [f"🔍 '{query}' 검색 결과 ({len(results)}개):\n\n"]
+        parts.extend(
+            f"**결과 {i}:**\n"
+            f"문서: {result.get('metadata', {}).get('filename', 'Unknown')}\n"
+            f"내용: {result['text'][:200]}...\n"
+            f"유사도: {similarity:.3f}\n\n"
+            for i, (result, similarity) in enumerate(zip(results, similarities), 1)
+        )
         
-        return response
+        return "".join(parts)
     
     except Exception as e:
         logger.error(f"검색 오류: {e}")
@@ -243,17 +244,16 @@ async def chat_with_documents(question: str, n_results: int = 3) -> str:
         if "error" in result:
             return f"❌ 채팅 오류: {result['error']}"
         
-        response = f"🤖 질문: {result['query']}\n\n"
-        response += f"답변: {result['answer']}\n\n"
+        parts = [f"🤖 질문: {result['query']}\n\n답변: {result['answer']}\n\n"]
         
         if result['sources']:
-            response += "📚 참조 문서:\n"
-            for i, source in enumerate(result['sources'], 1):
-                metadata = source.get('metadata', {})
-                filename = metadata.get('filename', 'Unknown')
-                response += f"{i}. {filename}\n"
+            parts.append("📚 참조 문서:\n")
+            parts.extend(
+                f"{i}. {source.get('metadata', {}).get('filename', 'Unknown')}\n"
+                for i, source in enumerate(result['sources'], 1)
+            )
         
-        return response
+        return "".join(parts)
     
     except Exception as e:
         logger.error(f"채팅 오류: {e}")
@@ -264,13 +264,13 @@ async def get_rag_info() -> str:
     try:
         info = rag_system.get_collection_info()
         
-        response = "📊 RAG 시스템 정보:\n\n"
-        response += f"📁 컬렉션명: {info.get('collection_name', 'Unknown')}\n"
-        response += f"📄 총 문서 수: {info.get('total_documents', 0)}개\n"
-        response += f"📏 청크 크기: {info.get('chunk_size', 0)}자\n"
-        response += f"🔄 청크 겹침: {info.get('chunk_overlap', 0)}자\n"
-        
-        return response
+        return (
+            "📊 RAG 시스템 정보:\n\n"
+            f"📁 컬렉션명: {info.get('collection_name', 'Unknown')}\n"
+            f"📄 총 문서 수: {info.get('total_documents', 0)}개\n"
+            f"📏 청크 크기: {info.get('chunk_size', 0)}자\n"
+            f"🔄 청크 겹침: {info.get('chunk_overlap', 0)}자\n"
+        )
     
     except Exception as e:
         logger.error(f"정보 조회 오류: {e}")
@@ -5,10 +5,12 @@ PDF 파싱, 청킹, 임베딩, 벡터 검색을 통한 RAG 시스템
 """
 
 import os
+import io
 import json
+import base64
 import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, BinaryIO, Iterable, Iterator
 from pathlib import Path
 import uuid
 from datetime import datetime
@@ -26,11 +28,10 @@ import chromadb
 from chromadb.config import Settings
 
 # AWS Bedrock
-import boto3
 from langchain_aws import BedrockEmbeddings, ChatBedrock
+from bedrock_client import get_runtime_client
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
 
 # 환경변수 로딩
 from dotenv import load_dotenv
@@ -40,6 +41,47 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 텍스트 정리용 정규식 (모듈 로드 시 한 번만 컴파일)
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+_SPECIAL_CHAR_PATTERN = re.compile(r'[^\w\s가-힣.,!?;:()\[\]{}"\'-]')
+_BLANK_LINES_PATTERN = re.compile(r'\n\s*\n')
+
+# RAG 답변 프롬프트 (모듈 로드 시 한 번만 생성)
+RAG_PROMPT_TEMPLATE = ChatPromptTemplate.from_template("""
+다음 문서들을 참조하여 사용자의 질문에 정확하고 도움이 되는 답변을 제공해주세요.
+
+참조 문서:
+{context}
+
+사용자 질문: {question}
+
+답변 가이드라인:
+1. 참조 문서의 내용을 바탕으로 정확한 정보를 제공하세요.
+2. 답변할 수 없는 내용은 "문서에서 해당 정보를 찾을 수 없습니다"라고 명시하세요.
+3. 답변은 한국어로 작성하세요.
+4. 답변의 근거가 되는 문서 번호를 [문서 X] 형태로 언급하세요.
+5. 간결하고 명확하게 답변하세요.
+
+답변:
+""")
+
+# PDF 임시 파일에 기록하는 단위 (1MB)
+_PDF_COPY_CHUNK_SIZE = 1 << 20
+
+def _iter_base64_decoded(data: str) -> Iterator[bytes]:
+    """Base64 문자열을 1MB 단위로 디코딩 (디코딩된 전체 바이트를 한 번에 만들지 않음)"""
+    chunk_chars = _PDF_COPY_CHUNK_SIZE // 3 * 4
+    pending = ""
+    for start in range(0, len(data), chunk_chars):
+        # 개행/공백을 제거하고 4문자 경계에 맞지 않는 나머지는 다음 청크로 넘김
+        piece = pending + "".join(data[start:start + chunk_chars].split())
+        usable = len(piece) - len(piece) % 4
+        pending = piece[usable:]
+        if usable:
+            yield base64.b64decode(piece[:usable])
+    if pending:
+        yield base64.b64decode(pending)
+
 class RAGSystem:
     """RAG 시스템 메인 클래스"""
     
@@ -60,10 +102,7 @@ class RAGSystem:
         self.chunk_overlap = chunk_overlap
         
         # AWS Bedrock 클라이언트 초기화
-        self.bedrock_client = boto3.client(
-            'bedrock-runtime',
-            region_name=os.getenv('AWS_REGION', 'ap-northeast-2')
-        )
+        self.bedrock_client = get_runtime_client()
         
         # 임베딩 모델 초기화
         self.embeddings = BedrockEmbeddings(
@@ -81,6 +120,10 @@ class RAGSystem:
             }
         )
         
+        # RAG 체인 구성 (요청마다 다시 만들지 않도록 한 번만 생성)
+        self.rag_stream_chain = RAG_PROMPT_TEMPLATE | self.llm
+        self.rag_answer_chain = self.rag_stream_chain | StrOutputParser()
+        
         # ChromaDB 초기화
         self.chroma_client = chromadb.PersistentClient(
             path="./chroma_db",
@@ -120,16 +163,15 @@ class RAGSystem:
         """
         try:
             doc = fitz.open(pdf_path)
-            text = ""
+            parts = []
             
             for page_num in range(len(doc)):
                 page = doc.load_page(page_num)
                 page_text = page.get_text()
-                text += f"\n--- 페이지 {page_num + 1} ---\n"
-                text += page_text
-                text += "\n"
+                parts.append(f"\n--- 페이지 {page_num + 1} ---\n{page_text}\n")
             
             doc.close()
+            text = "".join(parts)
             logger.info(f"PyMuPDF로 PDF 파싱 완료: {len(text)} 문자")
             return text
             
@@ -148,15 +190,14 @@ class RAGSystem:
             파싱된 텍스트
         """
         try:
-            text = ""
+            parts = []
             with pdfplumber.open(pdf_path) as pdf:
                 for page_num, page in enumerate(pdf.pages):
                     page_text = page.extract_text()
                     if page_text:
-                        text += f"\n--- 페이지 {page_num + 1} ---\n"
-                        text += page_text
-                        text += "\n"
+                        parts.append(f"\n--- 페이지 {page_num + 1} ---\n{page_text}\n")
             
+            text = "".join(parts)
             logger.info(f"pdfplumber로 PDF 파싱 완료: {len(text)} 문자")
             return text
             
@@ -199,13 +240,13 @@ class RAGSystem:
             정리된 텍스트
         """
         # 불필요한 공백 제거
-        text = re.sub(r'\s+', ' ', text)
+        text = _WHITESPACE_PATTERN.sub(' ', text)
         
         # 특수 문자 정리
-        text = re.sub(r'[^\w\s가-힣.,!?;:()\[\]{}"\'-]', '', text)
+        text = _SPECIAL_CHAR_PATTERN.sub('', text)
         
         # 연속된 줄바꿈 제거
-        text = re.sub(r'\n\s*\n', '\n\n', text)
+        text = _BLANK_LINES_PATTERN.sub('\n\n', text)
         
         return text.strip()
     
@@ -419,78 +460,59 @@ class RAGSystem:
         Returns:
             처리 결과 딕셔너리
         """
+        return self.process_pdf_fileobj(io.BytesIO(pdf_bytes), filename, document_metadata)
+    
+    def process_pdf_base64(self, pdf_data: str, filename: str,
+                           document_metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Base64로 인코딩된 PDF를 처리하여 RAG 시스템에 추가
+        
+        청크 단위로 디코딩하면서 임시 파일에 기록하므로 디코딩된 전체 바이트를 메모리에 두지 않음
+        
+        Args:
+            pdf_data: Base64로 인코딩된 PDF 데이터
+            filename: 파일명
+            document_metadata: 문서 메타데이터
+            
+        Returns:
+            처리 결과 딕셔너리
+        """
+        return self._process_pdf_chunks(_iter_base64_decoded(pdf_data), filename, document_metadata)
+    
+    def process_pdf_fileobj(self, fileobj: BinaryIO, filename: str,
+                            document_metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        파일 객체(업로드 스풀 파일 등)의 PDF를 처리하여 RAG 시스템에 추가
+        
+        전체 내용을 메모리에 올리지 않고 청크 단위로 임시 파일에 복사한 뒤 파싱
+        
+        Args:
+            fileobj: PDF 데이터를 읽을 바이너리 파일 객체
+            filename: 파일명
+            document_metadata: 문서 메타데이터
+            
+        Returns:
+            처리 결과 딕셔너리
+        """
+        chunks = iter(lambda: fileobj.read(_PDF_COPY_CHUNK_SIZE), b"")
+        return self._process_pdf_chunks(chunks, filename, document_metadata)
+    
+    def _process_pdf_chunks(self, chunks: Iterable[bytes], filename: str,
+                            document_metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+        """PDF 데이터 청크를 임시 파일에 기록한 뒤 처리"""
         import tempfile
-        import os
         
+        temp_path = None
         try:
-            logger.info(f"PDF 바이트 처리 시작: {filename}")
+            logger.info(f"PDF 처리 시작: {filename}")
             
-            # 임시 파일로 저장
+            # 임시 파일로 저장 (청크 단위 기록)
             with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-                temp_file.write(pdf_bytes)
                 temp_path = temp_file.name
+                for chunk in chunks:
+                    temp_file.write(chunk)
             
-            try:
-                # PDF 파싱
-                text = self.parse_pdf(temp_path)
-                if not text or len(text.strip()) < 100:
-                    logger.error("PDF 파싱 결과가 부족합니다")
-                    return {
-                        "success": False,
-                        "error": "PDF 파싱 결과가 부족합니다",
-                        "chunks_created": 0,
-                        "total_chunks": 0
-                    }
-                
-                # 텍스트 청킹
-                chunks = self.chunk_text(text)
-                if not chunks:
-                    logger.error("청크 생성에 실패했습니다")
-                    return {
-                        "success": False,
-                        "error": "청크 생성에 실패했습니다",
-                        "chunks_created": 0,
-                        "total_chunks": 0
-                    }
-                
-                # 임베딩 생성
-                chunks_with_embeddings = self.embed_chunks(chunks)
-                
-                # 메타데이터 준비
-                if document_metadata is None:
-                    document_metadata = {}
-                
-                document_metadata.update({
-                    "source_file": filename,
-                    "filename": filename,
-                    "total_chunks": len(chunks),
-                    "processed_at": datetime.now().isoformat()
-                })
-                
-                # ChromaDB에 저장
-                success = self.store_chunks(chunks_with_embeddings, document_metadata)
-                
-                if success:
-                    logger.info(f"PDF 바이트 처리 완료: {filename}")
-                    return {
-                        "success": True,
-                        "chunks_created": len(chunks),
-                        "total_chunks": len(chunks),
-                        "message": f"PDF '{filename}' 처리 완료"
-                    }
-                else:
-                    logger.error(f"PDF 저장 실패: {filename}")
-                    return {
-                        "success": False,
-                        "error": "PDF 저장 실패",
-                        "chunks_created": 0,
-                        "total_chunks": 0
-                    }
-                    
-            finally:
-                # 임시 파일 삭제
-                if os.path.exists(temp_path):
-                    os.unlink(temp_path)
+            return self._process_pdf_path(temp_path, filename, document_metadata)
                     
         except Exception as e:
             logger.error(f"PDF 바이트 처리 오류: {e}")
@@ -500,6 +522,69 @@ class RAGSystem:
                 "chunks_created": 0,
                 "total_chunks": 0
             }
+        finally:
+            # 임시 파일 삭제 (기록 도중 디코딩 오류가 나도 정리)
+            if temp_path and os.path.exists(temp_path):
+                os.unlink(temp_path)
+    
+    def _process_pdf_path(self, pdf_path: str, filename: str,
+                          document_metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+        """디스크의 PDF를 파싱, 청킹, 임베딩하여 ChromaDB에 저장"""
+        # PDF 파싱
+        text = self.parse_pdf(pdf_path)
+        if not text or len(text.strip()) < 100:
+            logger.error("PDF 파싱 결과가 부족합니다")
+            return {
+                "success": False,
+                "error": "PDF 파싱 결과가 부족합니다",
+                "chunks_created": 0,
+                "total_chunks": 0
+            }
+        
+        # 텍스트 청킹
+        chunks = self.chunk_text(text)
+        if not chunks:
+            logger.error("청크 생성에 실패했습니다")
+            return {
+                "success": False,
+                "error": "청크 생성에 실패했습니다",
+                "chunks_created": 0,
+                "total_chunks": 0
+            }
+        
+        # 임베딩 생성
+        chunks_with_embeddings = self.embed_chunks(chunks)
+        
+        # 메타데이터 준비
+        if document_metadata is None:
+            document_metadata = {}
+        
+        document_metadata.update({
+            "source_file": filename,
+            "filename": filename,
+            "total_chunks": len(chunks),
+            "processed_at": datetime.now().isoformat()
+        })
+        
+        # ChromaDB에 저장
+        success = self.store_chunks(chunks_with_embeddings, document_metadata)
+        
+        if success:
+            logger.info(f"PDF 바이트 처리 완료: {filename}")
+            return {
+                "success": True,
+                "chunks_created": len(chunks),
+                "total_chunks": len(chunks),
+                "message": f"PDF '{filename}' 처리 완료"
+            }
+        else:
+            logger.error(f"PDF 저장 실패: {filename}")
+            return {
+                "success": False,
+                "error": "PDF 저장 실패",
+                "chunks_created": 0,
+                "total_chunks": 0
+            }
     
     def search(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
         """
@@ -587,35 +672,8 @@ class RAGSystem:
             
             context = "\n\n".join(context_docs)
             
-            # 3. 프롬프트 템플릿 생성
-            prompt_template = ChatPromptTemplate.from_template("""
-다음 문서들을 참조하여 사용자의 질문에 정확하고 도움이 되는 답변을 제공해주세요.
-
-참조 문서:
-{context}
-
-사용자 질문: {question}
-
-답변 가이드라인:
-1. 참조 문서의 내용을 바탕으로 정확한 정보를 제공하세요.
-2. 답변할 수 없는 내용은 "문서에서 해당 정보를 찾을 수 없습니다"라고 명시하세요.
-3. 답변은 한국어로 작성하세요.
-4. 답변의 근거가 되는 문서 번호를 [문서 X] 형태로 언급하세요.
-5. 간결하고 명확하게 답변하세요.
-
-답변:
-""")
-            
-            # 4. RAG 체인 구성
-            rag_chain = (
-                {"context": RunnablePassthrough(), "question": RunnablePassthrough()}
-                | prompt_template
-                | self.llm
-                | StrOutputParser()
-            )
-            
-            # 5. LLM 답변 생성
-            answer = rag_chain.invoke({
+            # 3. LLM 답변 생성 (context, question은 템플릿 변수로 그대로 치환됨)
+            answer = self.rag_answer_chain.invoke({
                 "context": context,
                 "question": query
             })
@@ -688,40 +746,14 @@ class RAGSystem:
                 "sources": sources
             }
             
-            # 3. 프롬프트 템플릿 생성
-            prompt_template = ChatPromptTemplate.from_template("""
-다음 문서들을 참조하여 사용자의 질문에 정확하고 도움이 되는 답변을 제공해주세요.
-
-참조 문서:
-{context}
-
-사용자 질문: {question}
-
-답변 가이드라인:
-1. 참조 문서의 내용을 바탕으로 정확한 정보를 제공하세요.
-2. 답변할 수 없는 내용은 "문서에서 해당 정보를 찾을 수 없습니다"라고 명시하세요.
-3. 답변은 한국어로 작성하세요.
-4. 답변의 근거가 되는 문서 번호를 [문서 X] 형태로 언급하세요.
-5. 간결하고 명확하게 답변하세요.
-
-답변:
-""")
-            
-            # 4. RAG 체인 구성
-            rag_chain = (
-                {"context": RunnablePassthrough(), "question": RunnablePassthrough()}
-                | prompt_template
-                | self.llm
-            )
-            
             yield {
                 "type": "generation_start",
                 "message": "AI가 답변을 생성하는 중..."
             }
             
-            # 5. LLM 스트리밍 답변 생성
+            # 3. LLM 스트리밍 답변 생성
             full_answer = ""
-            async for chunk in rag_chain.astream({
+            async for chunk in self.rag_stream_chain.astream({
                 "context": context,
                 "question": query
             }):
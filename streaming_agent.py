@@ -1,29 +1,297 @@
-from typing import Dict, List, Any, TypedDict, Annotated, Literal, AsyncGenerator, Tuple
+from typing import Dict, List, Any, Annotated, Literal, AsyncGenerator, Tuple, Optional
 from langgraph.graph import StateGraph, END
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.tools import tool
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, AIMessageChunk, SystemMessage, ToolMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.tools import StructuredTool, tool
 from langgraph.prebuilt import ToolNode
-from langchain_aws import ChatBedrock
+from pydantic import BaseModel, Field
+from bedrock_client import get_bedrock_client, uses_converse_api
 from mcp_client import mcp_client
 from config import Config
 import json
 import asyncio
+import hashlib
 import logging
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, fields
+
+# Prefer orjson for serializing tool results, fall back to stdlib json
+try:
+    import orjson
+    
+    def _dumps_compact(obj: Any) -> str:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+except ImportError:
+    def _dumps_compact(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str)
 
 # Configure logger for streaming agent
 logger = logging.getLogger(__name__)
 
-class StreamingAgentState(TypedDict):
+@dataclass(slots=True)
+class StreamingAgentState:
     """State for the streaming agent"""
-    messages: Annotated[List[BaseMessage], "The conversation messages"]
-    user_input: str
-    needs_tools: bool
-    final_response: str
-    error_message: str
-    current_step: str
-    step_details: str
-    iteration_count: int
+    messages: Annotated[List[BaseMessage], "The conversation messages"] = field(default_factory=list)
+    user_input: str = ""
+    needs_tools: bool = False
+    final_response: str = ""
+    error_message: str = ""
+    current_step: str = ""
+    # Set only by direct_response; the one answer that doesn't depend on tools or their data
+    answered_directly: bool = False
+    step_details: str = ""
+    iteration_count: int = 0
+
+# Prompts are static, so they are defined once here instead of per node call.
+# Dynamic content (tool names, history, user input) goes after the system
+# prompt so the prompt prefix stays byte-identical across calls.
+DIRECT_SYSTEM_PROMPT = """You are a helpful AI assistant. Provide clear, accurate, and helpful responses to user questions and requests. 
+                
+Be conversational, friendly, and informative. When users ask for multiple tasks, you can use multiple tools in sequence to complete them all."""
+
+# Rendered with str.format once the tool list is known
+TOOLS_SYSTEM_PROMPT_TEMPLATE = """You are a helpful AI assistant with access to various tools. When users ask for specific information that requires tools, use them appropriately.
+
+Available tools:
+{tools_text}
+
+For database operations, use the appropriate tools:
+- list_databases: List all available databases - Use list_databases()
+- use_database: Switch to a specific database - Use use_database(database_name="database_name")
+- query: Execute SQL queries (SELECT, INSERT, UPDATE, DELETE, CREATE, DROP, etc.) - Use query(sql="SELECT * FROM table", database="database_name")
+- list_tables: List all tables in the current or specified database - Use list_tables(database="database_name")
+- describe_table: Get table structure information - Use describe_table(table_name="table_name", database="database_name")
+- get_current_database: Get the name of the currently connected database - Use get_current_database()
+
+For calculator operations, use the appropriate tools:
+- add: Add two numbers together - Use add(a=10, b=5) for "10 + 5"
+- multiply: Multiply two numbers together - Use multiply(a=7, b=8) for "7 × 8"
+- divide: Divide first number by second number - Use divide(a=20, b=4) for "20 ÷ 4"
+
+For RAG (Retrieval-Augmented Generation) operations, use the appropriate tools:
+- rag_upload_pdf: Upload and process PDF files - Use rag_upload_pdf(pdf_data="base64_data", filename="document.pdf", metadata={{"title": "문서제목"}})
+- rag_search: Search for relevant documents - Use rag_search(query="검색어", n_results=5)
+- rag_chat: Ask questions about uploaded documents - Use rag_chat(question="질문", n_results=3)
+- rag_get_info: Get RAG system information - Use rag_get_info()
+
+IMPORTANT RAG USAGE GUIDELINES:
+1. ALWAYS try to use rag_chat first when users ask questions about people, topics, or information that might be in uploaded documents
+2. Use rag_chat for questions like "Who is [person name]?", "Tell me about [topic]", "What is [concept]?", etc.
+3. Use rag_search when users want to find specific documents or information
+4. Use rag_upload_pdf when users want to upload documents
+5. If rag_chat doesn't find relevant information, then provide a general response
+6. For any question about a person, company, or topic, ALWAYS check if there's relevant information in the document database first
+
+IMPORTANT: 
+1. For database list requests, use list_databases()
+2. For table list requests, use list_tables(database="database_name")
+3. For table structure requests, use describe_table(table_name="table_name", database="database_name")
+4. For calculation requests, use the appropriate calculator tool (add, multiply, divide)
+5. For document upload requests, use rag_upload_pdf with base64 encoded PDF data
+6. For document search requests, use rag_search with appropriate query
+7. For questions about documents, use rag_chat to get AI-powered answers
+8. Always specify the database parameter when available
+9. "No tables found in the database." is a NORMAL response, not an error. It simply means the database is empty.
+
+Always provide the exact tool calls needed for the user's request."""
+
+# Graph nodes whose LLM tokens are forwarded to the client as they arrive; a tool-calling
+# turn of llm_with_tools is taken back with a stream_discard update once its tool call shows up
+STREAMED_NODES = frozenset({"direct_response", "llm_with_tools", "final_response"})
+
+# Local intent patterns, checked before spending an LLM round-trip on analysis
+_TOOL_INTENT_PATTERN = re.compile(
+    r"\d+(?:\.\d+)?\s*(?:[-+*/×÷]|plus|minus|times|divided by|더하기|빼기|곱하기|나누기)\s*\d"
+    r"|\b(?:calculate|databases?|tables?|sql|query|schema|pdf|documents?|upload|rag|directory|list files|read file|write file)\b"
+    r"|계산|데이터베이스|테이블|쿼리|스키마|문서|업로드|디렉토리|파일",
+    re.IGNORECASE
+)
+# Only a message that is nothing but a greeting is direct; "Hello, who is X?" still needs a lookup
+_DIRECT_INTENT_PATTERN = re.compile(
+    r"^\s*(?:(?:hi|hello|hey)(?:\s+there)?|good (?:morning|afternoon|evening)|thanks|thank you|how are you)\W*$"
+    r"|^\s*(?:안녕(?:하세요|하십니까)?|고마워요?|감사합니다|반가워요?|반갑습니다)\W*$",
+    re.IGNORECASE
+)
+
+def _classify_intent(user_input: str) -> Optional[bool]:
+    """Return True/False when the input clearly does/doesn't need tools, None if ambiguous"""
+    needs_tools = _TOOL_INTENT_PATTERN.search(user_input) is not None
+    is_direct = _DIRECT_INTENT_PATTERN.search(user_input) is not None
+    if needs_tools != is_direct:
+        return needs_tools
+    return None
+
+def _system_message(text: str) -> SystemMessage:
+    """Build a system message, marking it as a prompt-cache checkpoint when enabled"""
+    if not Config.BEDROCK_PROMPT_CACHING:
+        return SystemMessage(content=text)
+    # Everything up to and including this block (tool schemas + system prompt) is cached by Bedrock.
+    # Converse takes a separate cachePoint block instead of Anthropic's cache_control field
+    if uses_converse_api():
+        return SystemMessage(content=[{"type": "text", "text": text}, {"cachePoint": {"type": "default"}}])
+    return SystemMessage(content=[{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}])
+
+def _log_cache_usage(response: BaseMessage):
+    """Log prompt-cache hits and writes reported by Bedrock"""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    usage = getattr(response, "usage_metadata", None) or {}
+    details = usage.get("input_token_details") or {}
+    logger.debug(
+        "🧊 Prompt cache: read=%s, created=%s, input=%s",
+        details.get("cache_read", 0), details.get("cache_creation", 0), usage.get("input_tokens", 0)
+    )
+
+# Prompt templates are built once at import and only bound to variables per call
+DIRECT_PROMPT = ChatPromptTemplate.from_messages([
+    _system_message(DIRECT_SYSTEM_PROMPT),
+    MessagesPlaceholder("history"),
+    ("human", "{user_input}")
+])
+
+# Read-only tools; only these are memoized. Any other tool may change state
+# (write_file, edit_file, use_database, query, ...), so running one drops the memo
+_READ_ONLY_TOOLS = frozenset({
+    # filesystem
+    "read_file", "read_text_file", "read_media_file", "read_multiple_files",
+    "list_directory", "list_directory_with_sizes", "directory_tree",
+    "search_files", "get_file_info", "list_allowed_directories",
+    # databases
+    "list_databases", "list_tables", "describe_table", "get_current_database",
+    "postgres_list_databases", "postgres_list_tables", "postgres_describe_table",
+    "postgres_get_current_database",
+    "mysql_list_databases", "mysql_list_tables", "mysql_describe_table",
+    "mysql_get_current_database",
+    # calculator
+    "add", "multiply", "divide",
+    # rag
+    "rag_search", "rag_chat", "rag_get_info"
+})
+
+def _has_side_effects(tool_calls: List[Dict[str, Any]]) -> bool:
+    """Whether any of the tool calls may change state"""
+    return any(tool_call["name"] not in _READ_ONLY_TOOLS for tool_call in tool_calls)
+
+def _tool_call_key(tool_call: Dict[str, Any]) -> Optional[str]:
+    """Key identifying identical tool calls, or None if the call must not be memoized"""
+    if tool_call["name"] not in _READ_ONLY_TOOLS:
+        return None
+    return tool_call["name"] + json.dumps(tool_call.get("args", {}), sort_keys=True, default=str)
+
+def _tool_result_memo(messages: List[BaseMessage]) -> Dict[str, ToolMessage]:
+    """Map each read-only tool call made since the last state-changing call to its successful result"""
+    call_keys = {}
+    memo = {}
+    for message in messages:
+        tool_calls = getattr(message, "tool_calls", None) or ()
+        if _has_side_effects(tool_calls):
+            # A write may change what any earlier read returns, including reads batched with it
+            call_keys.clear()
+            memo.clear()
+            continue
+        for tool_call in tool_calls:
+            key = _tool_call_key(tool_call)
+            if key:
+                call_keys[tool_call["id"]] = key
+        if isinstance(message, ToolMessage) and message.status != "error":
+            key = call_keys.get(message.tool_call_id)
+            if key:
+                memo[key] = message
+    return memo
+
+def _content_text(content: Any) -> str:
+    """Text of a message content, which the Converse API returns as a list of blocks"""
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block if isinstance(block, str) else block.get("text", "")
+        for block in content or ()
+        if isinstance(block, str) or block.get("type") == "text"
+    )
+
+def _estimate_tokens(message: BaseMessage) -> int:
+    """Cheap token estimate: ~4 UTF-8 bytes per token holds for both English and Korean text"""
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    return len(content.encode()) // 4 + 1
+
+def _trim_history(conversation_history: List[BaseMessage]) -> List[BaseMessage]:
+    """Keep the most recent messages that fit both the message window and the token budget"""
+    window = Config.HISTORY_WINDOW
+    if window <= 0:
+        return []
+    
+    budget = Config.HISTORY_TOKEN_BUDGET
+    kept = []
+    for message in reversed(conversation_history[-window:]):
+        budget -= _estimate_tokens(message)
+        # The latest message is always kept, even if it alone exceeds the budget
+        if budget < 0 and kept:
+            break
+        kept.append(message)
+    kept.reverse()
+    return kept
+
+def _format_tool_result(result: Any) -> str:
+    """Serialize a tool result compactly and cap its size before it goes back to the LLM"""
+    # Plain text passes through as-is; JSON-encoding it would only add quotes and escapes
+    if not isinstance(result, str):
+        result = _dumps_compact(result)
+    max_chars = Config.TOOL_RESULT_MAX_CHARS
+    if len(result) > max_chars:
+        # Keep both ends: row listings and logs usually carry totals or errors at the tail
+        head = max_chars * 3 // 4
+        tail = max_chars - head
+        omitted = len(result) - head - tail
+        result = f"{result[:head]}\n...[truncated {omitted} chars]...\n{result[-tail:] if tail else ''}"
+    return result
+
+# Explicit argument schemas for MCP tools whose generic **kwargs wrapper would
+# give the LLM an empty signature; every tool shares the same dispatch coroutine
+class _NoArgs(BaseModel):
+    pass
+
+class _BinaryOperands(BaseModel):
+    a: float
+    b: float
+
+class _QueryArgs(BaseModel):
+    sql: str
+    database: Optional[str] = None
+
+class _DatabaseArgs(BaseModel):
+    database: Optional[str] = None
+
+class _ListDirectoryArgs(BaseModel):
+    path: str = "."
+
+class _RagUploadArgs(BaseModel):
+    pdf_data: str
+    filename: str
+    metadata: Optional[dict] = None
+
+class _RagSearchArgs(BaseModel):
+    query: str
+    n_results: int = 5
+
+class _RagChatArgs(BaseModel):
+    question: str
+    n_results: int = 3
+
+_TOOL_ARG_SCHEMAS: Dict[str, type] = {
+    "query": _QueryArgs,
+    "list_directory": _ListDirectoryArgs,
+    "add": _BinaryOperands,
+    "multiply": _BinaryOperands,
+    "divide": _BinaryOperands,
+    "list_tables": _DatabaseArgs,
+    "get_current_database": _NoArgs,
+    "rag_upload_pdf": _RagUploadArgs,
+    "rag_search": _RagSearchArgs,
+    "rag_chat": _RagChatArgs,
+    "rag_get_info": _NoArgs
+}
 
 # MCP tools will be dynamically loaded from MCP servers
 
@@ -31,10 +299,7 @@ class StreamingAgent:
     """Streaming-enabled agent with real-time progress updates using LangGraph"""
     
     def __init__(self):
-        self.llm = ChatBedrock(
-            model_id=Config.BEDROCK_MODEL_ID,
-            **Config.get_aws_config()
-        )
+        self.llm = get_bedrock_client().get_llm()
         
         # Tools will be loaded dynamically from MCP servers
         self.tools = []
@@ -44,24 +309,52 @@ class StreamingAgent:
         # Tool to server mapping
         self.tool_server_mapping = {}
         
-        # MCP initialization state
+        # MCP initialization state; the lock keeps concurrent first requests
+        # from running the MCP handshake and tool loading more than once
         self._mcp_initialized = False
+        self._mcp_init_lock = asyncio.Lock()
+        self._mcp_prefetch_task: Optional[asyncio.Task] = None
         
         # Graph will be built after MCP initialization
         self.graph = None
+        
+        # LRU cache of direct responses keyed by (normalized prompt, history),
+        # each stored with the monotonic time it expires at
+        self._response_cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        
+        self._tools_system_message = self._render_tools_system_message()
     
     async def _ensure_mcp_initialized(self):
         """Ensure MCP client is initialized and tools are loaded (only once)"""
-        logger.info("🔧 Checking MCP initialization status...")
-        if not self._mcp_initialized:
+        # Fast path for every request after the first, without touching the lock
+        if self._mcp_initialized:
+            return
+        
+        async with self._mcp_init_lock:
+            if self._mcp_initialized:
+                return
             logger.info("🚀 Initializing MCP client for the first time...")
             await mcp_client.initialize()
             logger.info("📦 Loading MCP tools...")
             await self._load_mcp_tools()
             self._mcp_initialized = True
             logger.info("✅ MCP initialization completed")
-        else:
-            logger.info("✅ MCP already initialized, skipping...")
+    
+    def prefetch_tools(self) -> asyncio.Task:
+        """Start MCP initialization and tool loading in the background"""
+        # Requests arriving meanwhile wait on the init lock instead of starting their own handshake
+        if self._mcp_prefetch_task is None or (self._mcp_prefetch_task.done() and not self._mcp_initialized):
+            self._mcp_prefetch_task = asyncio.create_task(self._ensure_mcp_initialized())
+        return self._mcp_prefetch_task
+    
+    def invalidate_tools(self):
+        """Force the MCP tool list to be reloaded on the next request"""
+        self._mcp_initialized = False
+        self.clear_response_cache()
+    
+    def clear_response_cache(self):
+        """Drop all cached responses, e.g. after documents were uploaded or tools reloaded"""
+        self._response_cache.clear()
     
     async def _load_mcp_tools(self):
         """Load tools from MCP servers and convert to LangChain tools"""
@@ -70,6 +363,9 @@ class StreamingAgent:
             mcp_tools = await mcp_client.get_available_tools()
             logger.info(f"🔍 MCP tools received: {mcp_tools}")
             
+            # Answers cached under the previous tool set may no longer hold
+            self.clear_response_cache()
+            
             # Convert MCP tools to LangChain tools
             self.tools = []
             for server_name, server_tools in mcp_tools.items():
@@ -83,10 +379,9 @@ class StreamingAgent:
                     else:
                         logger.error(f"❌ Failed to create LangChain tool for: {tool_info}")
             
-            # Create ToolNode and bind tools to LLM
+            # Create ToolNode; _build_graph binds the tools to the LLM
             if self.tools:
                 self.tool_node = ToolNode(self.tools)
-                self.llm_with_tools = self.llm.bind_tools(self.tools)
                 logger.info(f"✅ Loaded {len(self.tools)} tools from MCP servers")
                 logger.info(f"🔍 Tool names: {[tool.name for tool in self.tools]}")
                 
@@ -96,9 +391,7 @@ class StreamingAgent:
                 logger.warning("⚠️  No tools loaded from MCP servers")
                 
         except Exception as e:
-            logger.error(f"❌ Error loading MCP tools: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"❌ Error loading MCP tools: {e}")
             self.tools = []
     
     def _create_langchain_tool(self, tool_info: Dict[str, Any], server_name: str):
@@ -110,11 +403,10 @@ class StreamingAgent:
             
             logger.debug(f"🔍 Creating tool: {tool_name} with schema: {tool_input_schema}")
             
-            # Create a dynamic tool function (synchronous)
-            def tool_func(**kwargs) -> str:
+            # Create a dynamic tool coroutine; ToolNode gathers the calls of one turn on the event loop
+            async def tool_func(**kwargs) -> str:
                 try:
-                    print(f"🔍 tool_func called with kwargs: {kwargs}")
-                    logger.debug(f"🔍 Executing tool {tool_name} with args: {kwargs}")
+                    logger.debug("🔍 Executing tool %s with args: %s", tool_name, kwargs)
                     
                     # Handle kwargs wrapper - if there's a 'kwargs' key, use its value
                     if 'kwargs' in kwargs and len(kwargs) == 1:
@@ -122,164 +414,33 @@ class StreamingAgent:
                     else:
                         actual_args = kwargs
                     
-                    print(f"🔍 Actual args after unwrapping: {actual_args}")
+                    logger.debug("🔍 Actual args after unwrapping: %s", actual_args)
                     
-                    # Use the synchronous version of call_tool
-                    result = mcp_client.call_tool_sync(server_name, tool_name, actual_args)
+                    # Call over the persistent MCP session opened at initialization
+                    result = await mcp_client.call_tool(server_name, tool_name, actual_args)
                     
                     logger.debug(f"🔍 Tool result: {result}")
                     if result["success"]:
-                        return json.dumps(result["result"], indent=2)
+                        return _format_tool_result(result["result"])
                     else:
                         return f"Error: {result['error']}"
                 except Exception as e:
                     logger.error(f"❌ Error executing {tool_name}: {str(e)}")
                     return f"Error executing {tool_name}: {str(e)}"
             
-            # Create LangChain tool with proper typing
-            from langchain_core.tools import tool
-            from pydantic import BaseModel, Field
-            from typing import Optional
-            
-            # Create a simple Pydantic model for the tool
-            class ToolInput(BaseModel):
-                pass
-            
-            # Add fields based on input schema
-            if tool_input_schema and "properties" in tool_input_schema:
-                required_fields = tool_input_schema.get("required", [])
-                
-                for prop_name, prop_info in tool_input_schema["properties"].items():
-                    prop_type = str  # Default to string
-                    if prop_info.get("type") == "string":
-                        prop_type = str
-                    elif prop_info.get("type") == "integer":
-                        prop_type = int
-                    elif prop_info.get("type") == "boolean":
-                        prop_type = bool
-                    elif prop_info.get("type") == "array":
-                        prop_type = list
-                    
-                    # Add field to the model with default value
-                    default_value = prop_info.get("default")
-                    is_required = prop_name in required_fields
-                    
-                    # Set default values for common tools
-                    if default_value is None and prop_name == "path" and tool_name == "list_directory":
-                        default_value = "."  # Default to current directory
-                    elif default_value is None and prop_name == "sql" and tool_name == "query":
-                        default_value = "SELECT 1;"  # Default SQL query
-                    
-                    # Use ... for required fields, default_value for optional fields
-                    if is_required and default_value is None:
-                        field_default = ...
-                    else:
-                        field_default = default_value
-                    
-                    setattr(ToolInput, prop_name, Field(
-                        default=field_default,
-                        description=prop_info.get("description", "")
-                    ))
-            else:
-                # If no schema provided, add common defaults
-                if tool_name == "list_directory":
-                    setattr(ToolInput, "path", Field(default=".", description="Directory path to list"))
-                elif tool_name == "read_file":
-                    setattr(ToolInput, "path", Field(description="File path to read"))
-            
             # Set the function name and docstring
             tool_func.__name__ = tool_name
             tool_func.__doc__ = tool_description
             
-            # Create the tool with explicit function signatures for specific tools
-            if tool_name == "query":
-                # Create query tool with explicit sql and database parameters
-                def query_tool(sql: str, database: str = None) -> str:
-                    return tool_func(sql=sql, database=database)
-                
-                query_tool.__name__ = tool_name
-                query_tool.__doc__ = tool_description
-                langchain_tool = tool(query_tool)
-            elif tool_name == "list_directory":
-                # Create list_directory tool with explicit path parameter
-                def list_dir_tool(path: str = ".") -> str:
-                    return tool_func(path=path)
-                
-                list_dir_tool.__name__ = tool_name
-                list_dir_tool.__doc__ = tool_description
-                langchain_tool = tool(list_dir_tool)
-            elif tool_name in ["add", "multiply", "divide"]:
-                # Create calculator tools with explicit parameters
-                if tool_name == "add":
-                    def add_tool(a: float, b: float) -> str:
-                        return tool_func(a=a, b=b)
-                    add_tool.__name__ = tool_name
-                    add_tool.__doc__ = tool_description
-                    langchain_tool = tool(add_tool)
-                elif tool_name == "multiply":
-                    def multiply_tool(a: float, b: float) -> str:
-                        return tool_func(a=a, b=b)
-                    multiply_tool.__name__ = tool_name
-                    multiply_tool.__doc__ = tool_description
-                    langchain_tool = tool(multiply_tool)
-                elif tool_name == "divide":
-                    def divide_tool(a: float, b: float) -> str:
-                        return tool_func(a=a, b=b)
-                    divide_tool.__name__ = tool_name
-                    divide_tool.__doc__ = tool_description
-                    langchain_tool = tool(divide_tool)
-            # Skip use_database tool as it's not needed with explicit parameter passing
-            elif tool_name == "list_tables":
-                # Create list_tables tool with explicit database parameter
-                def list_tables_tool(database: str = None) -> str:
-                    if database:
-                        return tool_func(database=database)
-                    else:
-                        return tool_func()
-                
-                list_tables_tool.__name__ = tool_name
-                list_tables_tool.__doc__ = tool_description
-                langchain_tool = tool(list_tables_tool)
-            elif tool_name == "get_current_database":
-                # Create get_current_database tool with no parameters
-                def get_current_db_tool() -> str:
-                    return tool_func()
-                
-                get_current_db_tool.__name__ = tool_name
-                get_current_db_tool.__doc__ = tool_description
-                langchain_tool = tool(get_current_db_tool)
-            elif tool_name == "rag_upload_pdf":
-                # Create rag_upload_pdf tool with explicit parameters
-                def rag_upload_tool(pdf_data: str, filename: str, metadata: dict = None) -> str:
-                    return tool_func(pdf_data=pdf_data, filename=filename, metadata=metadata or {})
-                
-                rag_upload_tool.__name__ = tool_name
-                rag_upload_tool.__doc__ = tool_description
-                langchain_tool = tool(rag_upload_tool)
-            elif tool_name == "rag_search":
-                # Create rag_search tool with explicit parameters
-                def rag_search_tool(query: str, n_results: int = 5) -> str:
-                    return tool_func(query=query, n_results=n_results)
-                
-                rag_search_tool.__name__ = tool_name
-                rag_search_tool.__doc__ = tool_description
-                langchain_tool = tool(rag_search_tool)
-            elif tool_name == "rag_chat":
-                # Create rag_chat tool with explicit parameters
-                def rag_chat_tool(question: str, n_results: int = 3) -> str:
-                    return tool_func(question=question, n_results=n_results)
-                
-                rag_chat_tool.__name__ = tool_name
-                rag_chat_tool.__doc__ = tool_description
-                langchain_tool = tool(rag_chat_tool)
-            elif tool_name == "rag_get_info":
-                # Create rag_get_info tool with no parameters
-                def rag_info_tool() -> str:
-                    return tool_func()
-                
-                rag_info_tool.__name__ = tool_name
-                rag_info_tool.__doc__ = tool_description
-                langchain_tool = tool(rag_info_tool)
+            args_schema = _TOOL_ARG_SCHEMAS.get(tool_name)
+            if args_schema is not None:
+                # Known tools get an explicit signature over the shared dispatch coroutine
+                langchain_tool = StructuredTool.from_function(
+                    coroutine=tool_func,
+                    name=tool_name,
+                    description=tool_description,
+                    args_schema=args_schema
+                )
             else:
                 # Create the tool with proper schema for other tools
                 langchain_tool = tool(tool_func)
@@ -291,12 +452,33 @@ class StreamingAgent:
             return langchain_tool
             
         except Exception as e:
-            logger.error(f"❌ Error creating LangChain tool for {tool_info.get('name', 'unknown')}: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"❌ Error creating LangChain tool for {tool_info.get('name', 'unknown')}: {e}")
             return None
     
+    def _render_tools_system_message(self) -> SystemMessage:
+        """Render the tools system prompt for the currently loaded tools"""
+        tool_descriptions = [f"- {tool.name}: {tool.description}" for tool in self.tools]
+        tools_text = "\n".join(tool_descriptions) if tool_descriptions else "No tools available"
+        return _system_message(TOOLS_SYSTEM_PROMPT_TEMPLATE.format(tools_text=tools_text))
+    
     def _build_graph(self):
+        """Bind the loaded tools and compile the LangGraph workflow on first use"""
+        # Create LLM with tools
+        if self.tools:
+            self.llm_with_tools = self.llm.bind_tools(self.tools)
+            logger.info(f"✅ LLM bound with {len(self.tools)} tools")
+        else:
+            self.llm_with_tools = self.llm
+            logger.warning("⚠️ No tools available, using LLM without tools")
+        
+        self._tools_system_message = self._render_tools_system_message()
+        
+        # Nodes read the tool bindings at call time, so the graph topology never changes
+        # and reloading tools doesn't need a recompile
+        if self.graph is None:
+            self.graph = self._compile_graph()
+    
+    def _compile_graph(self):
         """Build the LangGraph workflow with conditional edges"""
         logger.info("🏗️ Building LangGraph workflow...")
         
@@ -328,7 +510,8 @@ class StreamingAgent:
             self._should_execute_tools,
             {
                 "execute": "execute_tools",
-                "final": "final_response"
+                "final": "final_response",
+                "done": END
             }
         )
         
@@ -346,301 +529,200 @@ class StreamingAgent:
         workflow.add_edge("direct_response", END)
         workflow.add_edge("final_response", END)
         
-        # Create LLM with tools
-        if self.tools:
-            self.llm_with_tools = self.llm.bind_tools(self.tools)
-            logger.info(f"✅ LLM bound with {len(self.tools)} tools")
-        else:
-            self.llm_with_tools = self.llm
-            logger.warning("⚠️ No tools available, using LLM without tools")
-        
         # Compile the graph
-        self.graph = workflow.compile()
+        graph = workflow.compile()
         logger.info("✅ LangGraph workflow built successfully")
+        return graph
     
     def _should_use_tools(self, state: StreamingAgentState) -> str:
         """Determine if tools should be used based on LLM analysis"""
-        return state.get("needs_tools", False) and "tools" or "direct"
+        return "tools" if state.needs_tools else "direct"
     
     def _should_execute_tools(self, state: StreamingAgentState) -> str:
         """Determine if tools should be executed based on LLM response"""
-        last_message = state["messages"][-1]
-        if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
+        last_message = state.messages[-1]
+        if getattr(last_message, 'tool_calls', None):
             return "execute"
-        else:
-            # If no tool calls, set the final response from the LLM's content
-            if hasattr(last_message, 'content') and last_message.content:
-                state["final_response"] = last_message.content
-            return "final"
+        # The answer is already in place, so skip the final_response hop entirely
+        if state.final_response:
+            return "done"
+        return "final"
     
     def _should_continue_after_tools(self, state: StreamingAgentState) -> str:
         """Determine if we should continue after tool execution"""
-        # Prevent infinite loops
-        from config import Config
-        max_iterations = Config.MAX_ITERATIONS
-        current_iterations = state.get("iteration_count", 0)
-        
-        if current_iterations >= max_iterations:
-            logger.warning(f"⚠️  Maximum iterations ({max_iterations}) reached, stopping")
-            return "final"
-        
-        # Check if we have tool results that need interpretation
-        if len(state["messages"]) >= 2:
-            last_message = state["messages"][-1]
-            # If the last message is a tool result, continue to interpret it
-            if hasattr(last_message, 'content') and last_message.content:
-                return "continue"
-        
-        # If we're ending, check if we have a final response from the last LLM call
-        if len(state["messages"]) >= 1:
-            last_message = state["messages"][-1]
-            if hasattr(last_message, 'content') and last_message.content and not state.get("final_response"):
-                state["final_response"] = last_message.content
-                logger.info("✅ Final response set from last LLM message")
+        # The iteration budget is enforced in _llm_with_tools_node, right before the LLM call
+        # If the last message is a tool result, continue to interpret it
+        if len(state.messages) >= 2 and getattr(state.messages[-1], 'content', None):
+            return "continue"
         
         return "final"
     
-    async def _analyze_input_node(self, state: StreamingAgentState) -> StreamingAgentState:
+    async def _analyze_input_node(self, state: StreamingAgentState) -> Dict[str, Any]:
         """Analyze input to determine if tools are needed"""
         logger.info("🔍 Analyzing input to determine tool usage...")
         
-        # Use LLM to analyze if tools are needed
-        analysis_prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a helpful assistant that analyzes user requests to determine if tools are needed.
-
-Available tools: {tool_names}
-
-Analyze the user's request and determine if any tools are needed to fulfill it.
-Respond with "YES" if tools are needed, "NO" if a direct response is sufficient.
-
-Examples:
-- "List files in directory" -> YES (needs list_directory tool)
-- "Show database tables" -> YES (needs query tool with SQL)
-- "Read a file" -> YES (needs read_text_file tool)
-- "Search for information" -> YES (needs brave_web_search tool)
-- "Calculate 10 + 5" -> YES (needs add tool)
-- "What is 7 times 8?" -> YES (needs multiply tool)
-- "Divide 20 by 4" -> YES (needs divide tool)
-- "10 더하기 5" -> YES (needs add tool)
-- "7 곱하기 8" -> YES (needs multiply tool)
-- "20 나누기 4" -> YES (needs divide tool)
-- "Upload PDF document" -> YES (needs rag_upload_pdf tool)
-- "Search documents" -> YES (needs rag_search tool)
-- "Ask about documents" -> YES (needs rag_chat tool)
-- "PDF 업로드" -> YES (needs rag_upload_pdf tool)
-- "문서 검색" -> YES (needs rag_search tool)
-- "문서 질문" -> YES (needs rag_chat tool)
-- "Who is John Doe?" -> YES (needs rag_chat tool to check documents)
-- "Tell me about 김성엽" -> YES (needs rag_chat tool to check documents)
-- "What is machine learning?" -> YES (needs rag_chat tool to check documents)
-- "김성엽은 누구인가요?" -> YES (needs rag_chat tool to check documents)
-- "회사 소개해줘" -> YES (needs rag_chat tool to check documents)
-- "프로젝트에 대해 알려줘" -> YES (needs rag_chat tool to check documents)
-- "What is the weather?" -> NO (direct response)
-- "Hello, how are you?" -> NO (direct response)
-- "Database table list" -> YES (needs query tool with SQL)
-- "데이터베이스 테이블 목록" -> YES (needs query tool with SQL)
-"""),
-            ("human", "User request: {user_input}")
-        ])
-        
-        tool_names = [tool.name for tool in self.tools] if self.tools else []
+        # Clear-cut requests are routed locally. Anything else goes to the tool-bound LLM,
+        # which decides between calling tools and answering directly in the same round-trip
+        intent = _classify_intent(state.user_input)
+        needs_tools = intent is not False
+        logger.info(f"🔍 Local analysis: needs_tools = {needs_tools}")
         
-        try:
-            response = await self.llm.ainvoke(analysis_prompt.format_messages(
-                tool_names=", ".join(tool_names),
-                user_input=state["user_input"]
-            ))
-            
-            needs_tools = "YES" in response.content.upper()
-            state["needs_tools"] = needs_tools
-            
-            logger.info(f"🔍 LLM analysis: needs_tools = {needs_tools}")
-            
-        except Exception as e:
-            logger.error(f"❌ Error in input analysis: {e}")
-            # Fallback to keyword-based detection
-            user_lower = state["user_input"].lower()
-            needs_tools = any(keyword in user_lower for keyword in [
-                "list", "ls", "directory", "files", "read", "write", "create", "search", "find", "query", "database", "sql", 
-                "table", "describe", "structure", "schema", "employee", "select", "show", "display",
-                "upload", "pdf", "document", "rag", "chat", "ask", "question", "answer", "who", "what", "tell", "about",
-                "디렉토리", "파일", "리스트", "목록", "보여줘", "보여주세요", "읽기", "쓰기", "검색", "찾기", "조회", "데이터베이스",
-                "업로드", "문서", "PDF", "질문", "답변", "채팅", "누구", "무엇", "알려줘", "소개", "설명", "에 대해"
-            ])
-            state["needs_tools"] = needs_tools
-            logger.info(f"🔍 Fallback analysis: needs_tools = {needs_tools}")
-        
-        return state
+        return {"needs_tools": needs_tools}
     
-    async def _direct_response_node(self, state: StreamingAgentState) -> StreamingAgentState:
+    async def _direct_response_node(self, state: StreamingAgentState) -> Dict[str, Any]:
         """Generate direct response without tools"""
         logger.info("💬 Generating direct response...")
         
         try:
-            conversation_history = state["messages"][:-1]
-            context_messages = []
-            for msg in conversation_history[-6:]:
-                if isinstance(msg, HumanMessage):
-                    context_messages.append(("human", msg.content))
-                elif isinstance(msg, AIMessage):
-                    context_messages.append(("assistant", msg.content))
-            
-            context_messages.append(("human", state["user_input"]))
+            conversation_history = state.messages[:-1]
+            history = [
+                msg for msg in conversation_history
+                if isinstance(msg, (HumanMessage, AIMessage))
+            ]
             
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", """You are a helpful AI assistant. Provide clear, accurate, and helpful responses to user questions and requests. 
-                
-Be conversational, friendly, and informative. When users ask for multiple tasks, you can use multiple tools in sequence to complete them all."""),
-                *context_messages
-            ])
-            
-            response = await self.llm.ainvoke(prompt.format_messages())
-            state["final_response"] = response.content
+            response = await self.llm.ainvoke(DIRECT_PROMPT.format_messages(
+                history=history,
+                user_input=state.user_input
+            ))
+            _log_cache_usage(response)
+            return {"final_response": _content_text(response.content), "answered_directly": True}
             
         except Exception as e:
             logger.error(f"❌ Error in direct response: {e}")
-            state["error_message"] = str(e)
-        
-        return state
+            return {"error_message": str(e)}
     
-    async def _llm_with_tools_node(self, state: StreamingAgentState) -> StreamingAgentState:
+    async def _llm_with_tools_node(self, state: StreamingAgentState) -> Dict[str, Any]:
         """LLM node with tools available"""
         logger.info("🤖 LLM thinking with tools...")
         
+        # Prevent infinite loops: check the budget before spending another LLM call
+        if state.iteration_count >= Config.MAX_ITERATIONS:
+            logger.warning(f"⚠️  Maximum iterations ({Config.MAX_ITERATIONS}) reached, stopping")
+            return {}
+        
         # Increment iteration count
-        state["iteration_count"] = state.get("iteration_count", 0) + 1
+        updates: Dict[str, Any] = {"iteration_count": state.iteration_count + 1}
         
         try:
-            # Add system message with tool guidance
-            tool_descriptions = []
-            for tool in self.tools:
-                tool_descriptions.append(f"- {tool.name}: {tool.description}")
-            
-            tools_text = "\n".join(tool_descriptions) if tool_descriptions else "No tools available"
-            
-            system_message = f"""You are a helpful AI assistant with access to various tools. When users ask for specific information that requires tools, use them appropriately.
-
-Available tools:
-{tools_text}
-
-For database operations, use the appropriate tools:
-- list_databases: List all available databases - Use list_databases()
-- use_database: Switch to a specific database - Use use_database(database_name="database_name")
-- query: Execute SQL queries (SELECT, INSERT, UPDATE, DELETE, CREATE, DROP, etc.) - Use query(sql="SELECT * FROM table", database="database_name")
-- list_tables: List all tables in the current or specified database - Use list_tables(database="database_name")
-- describe_table: Get table structure information - Use describe_table(table_name="table_name", database="database_name")
-- get_current_database: Get the name of the currently connected database - Use get_current_database()
-
-For calculator operations, use the appropriate tools:
-- add: Add two numbers together - Use add(a=10, b=5) for "10 + 5"
-- multiply: Multiply two numbers together - Use multiply(a=7, b=8) for "7 × 8"
-- divide: Divide first number by second number - Use divide(a=20, b=4) for "20 ÷ 4"
-
-For RAG (Retrieval-Augmented Generation) operations, use the appropriate tools:
-- rag_upload_pdf: Upload and process PDF files - Use rag_upload_pdf(pdf_data="base64_data", filename="document.pdf", metadata={{"title": "문서제목"}})
-- rag_search: Search for relevant documents - Use rag_search(query="검색어", n_results=5)
-- rag_chat: Ask questions about uploaded documents - Use rag_chat(question="질문", n_results=3)
-- rag_get_info: Get RAG system information - Use rag_get_info()
-
-IMPORTANT RAG USAGE GUIDELINES:
-1. ALWAYS try to use rag_chat first when users ask questions about people, topics, or information that might be in uploaded documents
-2. Use rag_chat for questions like "Who is [person name]?", "Tell me about [topic]", "What is [concept]?", etc.
-3. Use rag_search when users want to find specific documents or information
-4. Use rag_upload_pdf when users want to upload documents
-5. If rag_chat doesn't find relevant information, then provide a general response
-6. For any question about a person, company, or topic, ALWAYS check if there's relevant information in the document database first
-
-IMPORTANT: 
-1. For database list requests, use list_databases()
-2. For table list requests, use list_tables(database="database_name")
-3. For table structure requests, use describe_table(table_name="table_name", database="database_name")
-4. For calculation requests, use the appropriate calculator tool (add, multiply, divide)
-5. For document upload requests, use rag_upload_pdf with base64 encoded PDF data
-6. For document search requests, use rag_search with appropriate query
-7. For questions about documents, use rag_chat to get AI-powered answers
-8. Always specify the database parameter when available
-9. "No tables found in the database." is a NORMAL response, not an error. It simply means the database is empty.
-
-Always provide the exact tool calls needed for the user's request."""
-
             # Create messages with system guidance
-            messages_with_system = [{"role": "system", "content": system_message}] + state["messages"]
+            messages_with_system = [self._tools_system_message] + state.messages
             
             response = await self.llm_with_tools.ainvoke(messages_with_system)
-            state["messages"].append(response)
+            _log_cache_usage(response)
+            updates["messages"] = state.messages + [response]
             
             logger.debug(f"🔍 LLM response: {response.content}")
-            if hasattr(response, 'tool_calls') and response.tool_calls:
+            if getattr(response, 'tool_calls', None):
                 logger.info(f"🔍 Tool calls generated: {response.tool_calls}")
             else:
                 # If no tool calls, this might be the final response
-                if response.content and not state.get("final_response"):
-                    state["final_response"] = response.content
+                response_text = _content_text(response.content)
+                if response_text and not state.final_response:
+                    updates["final_response"] = response_text
                     logger.info("✅ Final response set from LLM with tools")
+                # Answered without touching any tool, so the turn is treated like a direct response
+                if state.iteration_count == 0:
+                    updates["needs_tools"] = False
             
         except Exception as e:
             logger.error(f"❌ Error in LLM with tools: {e}")
-            state["error_message"] = str(e)
+            updates["error_message"] = str(e)
         
-        return state
+        return updates
     
-    async def _execute_tools_node(self, state: StreamingAgentState) -> StreamingAgentState:
+    async def _execute_tools_node(self, state: StreamingAgentState) -> Dict[str, Any]:
         """Execute tools using ToolNode"""
         logger.info("🔧 Executing tools...")
         
         try:
-            tool_results = await self.tool_node.ainvoke({"messages": [state["messages"][-1]]})
-            state["messages"].extend(tool_results["messages"])
+            last_message = state.messages[-1]
+            
+            # Reuse results of identical calls already made earlier in this run, unless this
+            # batch also changes state: its calls run concurrently, so reads may see the write
+            if _has_side_effects(last_message.tool_calls):
+                memo = {}
+            else:
+                memo = _tool_result_memo(state.messages[:-1])
+            fresh_calls = []
+            reused_results = []
+            for tool_call in last_message.tool_calls:
+                key = _tool_call_key(tool_call)
+                cached = memo.get(key) if key else None
+                if cached is None:
+                    fresh_calls.append(tool_call)
+                else:
+                    logger.info(f"♻️ Reusing result of duplicate tool call: {tool_call['name']}")
+                    reused_results.append(ToolMessage(
+                        content=cached.content,
+                        name=cached.name,
+                        tool_call_id=tool_call["id"]
+                    ))
+            
+            new_results = []
+            if fresh_calls:
+                if reused_results:
+                    last_message = last_message.model_copy(update={"tool_calls": fresh_calls})
+                tool_results = await self.tool_node.ainvoke({"messages": [last_message]})
+                new_results = tool_results["messages"]
+            
+            return {"messages": state.messages + reused_results + new_results}
             
         except Exception as e:
             logger.error(f"❌ Error executing tools: {e}")
-            state["error_message"] = str(e)
-        
-        return state
+            return {"error_message": str(e)}
     
-    async def _final_response_node(self, state: StreamingAgentState) -> StreamingAgentState:
+    async def _final_response_node(self, state: StreamingAgentState) -> Dict[str, Any]:
         """Generate final response after tool execution"""
         logger.info("📝 Generating final response...")
         
+        # If we already have a final response from the last LLM call, use it
+        if state.final_response:
+            logger.info("✅ Using existing final response")
+            return {}
+        
         try:
-            # If we already have a final response from the last LLM call, use it
-            if state.get("final_response"):
-                logger.info("✅ Using existing final response")
-                return state
-            
-            # Otherwise, generate a new response
-            response = await self.llm_with_tools.ainvoke(state["messages"])
-            state["final_response"] = response.content
+            # Otherwise, generate a new response with the same system prefix as the tool calls
+            messages_with_system = [self._tools_system_message] + state.messages
+            response = await self.llm_with_tools.ainvoke(messages_with_system)
+            _log_cache_usage(response)
+            return {"final_response": _content_text(response.content)}
             
         except Exception as e:
             logger.error(f"❌ Error in final response: {e}")
-            state["error_message"] = str(e)
             # Set a fallback response
-            if not state.get("final_response"):
-                state["final_response"] = "죄송합니다. 응답을 생성하는 중 오류가 발생했습니다."
-        
-        return state
+            return {
+                "error_message": str(e),
+                "final_response": "죄송합니다. 응답을 생성하는 중 오류가 발생했습니다."
+            }
     
     async def run_streaming(self, user_input: str, conversation_history: List[BaseMessage] = None) -> AsyncGenerator[Dict[str, Any], None]:
         """Run the agent with streaming updates using LangGraph"""
         if conversation_history is None:
             conversation_history = []
         
+        # Trim history once here so the graph state never carries the unbounded list
+        conversation_history = _trim_history(conversation_history)
+        
+        # Serve repeated prompts from the response cache
+        cache_key = self._response_cache_key(user_input, conversation_history)
+        cached_response = self._get_cached_response(cache_key)
+        if cached_response is not None:
+            logger.info("✅ Response cache hit")
+            yield {"type": "stream", "chunk": cached_response}
+            yield {"type": "response_complete", "message": cached_response, "used_tools": False}
+            return
+        
         # Initialize MCP if not already done
         await self._ensure_mcp_initialized()
         
+        # _trim_history returned a fresh list, so the new turn is appended in place instead of copying it
+        conversation_history.append(HumanMessage(content=user_input))
+        
         # Initialize state
-        state: StreamingAgentState = {
-            "messages": conversation_history + [HumanMessage(content=user_input)],
-            "user_input": user_input,
-            "needs_tools": False,
-            "final_response": "",
-            "error_message": "",
-            "current_step": "",
-            "step_details": "",
-            "iteration_count": 0
-        }
+        state = StreamingAgentState(
+            messages=conversation_history,
+            user_input=user_input
+        )
         
         try:
             # Build graph if not already built (even without tools)
@@ -650,38 +732,101 @@ Always provide the exact tool calls needed for the user's request."""
             
             # Run the graph with streaming updates
             async for update in self._stream_graph_execution(state):
+                # Only direct answers are cached; anything produced with tools bound may depend on live data
+                if update["type"] == "response_complete" and update.get("answered_directly"):
+                    self._store_cached_response(cache_key, update["message"])
                 yield update
                 
         except Exception as e:
             logger.error(f"❌ Error in run_streaming: {e}")
             yield {"type": "error", "message": f"I apologize, but I encountered an error: {str(e)}"}
     
+    @staticmethod
+    def _response_cache_key(user_input: str, conversation_history: List[BaseMessage]) -> str:
+        """Hash the normalized prompt together with the conversation history"""
+        normalized_prompt = " ".join(user_input.split()).lower()
+        history = [(msg.type, msg.content) for msg in conversation_history]
+        payload = json.dumps([normalized_prompt, history], ensure_ascii=False, default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()
+    
+    def _get_cached_response(self, cache_key: str) -> Optional[str]:
+        """Return an unexpired cached response, dropping it once its TTL has passed"""
+        entry = self._response_cache.get(cache_key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if time.monotonic() >= expires_at:
+            del self._response_cache[cache_key]
+            return None
+        self._response_cache.move_to_end(cache_key)
+        return response
+    
+    def _store_cached_response(self, cache_key: str, response: str):
+        """Store a response, evicting the least recently used entry when full"""
+        if Config.RESPONSE_CACHE_SIZE <= 0 or Config.RESPONSE_CACHE_TTL <= 0 or not response:
+            return
+        self._response_cache[cache_key] = (time.monotonic() + Config.RESPONSE_CACHE_TTL, response)
+        self._response_cache.move_to_end(cache_key)
+        while len(self._response_cache) > Config.RESPONSE_CACHE_SIZE:
+            self._response_cache.popitem(last=False)
+    
     async def _stream_graph_execution(self, state: StreamingAgentState) -> AsyncGenerator[Dict[str, Any], None]:
         """Stream the execution of the LangGraph with progress updates"""
         try:
             # Step 1: Analyze input
             yield {"type": "step", "message": "🔍 Analyzing your request...", "details": ""}
-            await asyncio.sleep(0.3)
             
-            # Execute the graph
-            final_state = await self.graph.ainvoke(state)
+            final_state: Dict[str, Any] = {}
+            # Text streamed for the current LLM turn (one AIMessage id)
+            streamed_message_id = None
+            streamed_response = ""
+            is_tool_turn = False
+            emitted_tool_results = 0
             
-            # Extract and stream tool results
-            tool_results = self._extract_tool_results(final_state)
-            for tool_name, tool_result in tool_results:
-                yield {"type": "tool_result", "tool_name": tool_name, "result": tool_result}
-                await asyncio.sleep(0.1)
+            # "messages" yields LLM tokens as they are generated, "values" the state after each step
+            async for mode, payload in self.graph.astream(state, stream_mode=["messages", "values"]):
+                if mode == "messages":
+                    chunk, metadata = payload
+                    # Only answer-producing nodes are streamed; analysis is not user-facing.
+                    # Only LLM tokens count: at node end LangGraph re-emits id-less messages of the
+                    # node's output (history, the user's own input) as whole messages
+                    if metadata.get("langgraph_node") not in STREAMED_NODES or not isinstance(chunk, AIMessageChunk):
+                        continue
+                    if chunk.id != streamed_message_id:
+                        streamed_message_id, streamed_response, is_tool_turn = chunk.id, "", False
+                    if getattr(chunk, "tool_call_chunks", None):
+                        # This turn calls tools rather than answering; withdraw any preamble already sent
+                        if streamed_response and not is_tool_turn:
+                            yield {"type": "stream_discard"}
+                        streamed_response, is_tool_turn = "", True
+                    elif not is_tool_turn and (text := _content_text(chunk.content)):
+                        streamed_response += text
+                        yield {"type": "stream", "chunk": text}
+                else:
+                    # Depending on the LangGraph version, values arrive as a dict or as the state dataclass
+                    final_state = payload if isinstance(payload, dict) else {
+                        state_field.name: getattr(payload, state_field.name) for state_field in fields(payload)
+                    }
+                    tool_results = self._extract_tool_results(final_state)
+                    for tool_name, tool_result in tool_results[emitted_tool_results:]:
+                        yield {"type": "tool_result", "tool_name": tool_name, "result": tool_result}
+                    emitted_tool_results = len(tool_results)
             
             # Stream the final response
             if final_state.get("final_response"):
                 response = final_state["final_response"]
-                for char in response:
-                    yield {"type": "stream", "chunk": char}
-                    await asyncio.sleep(0.01)
+                # Responses that were not produced token by token (e.g. set by the tool-calling turn) go out in one chunk
+                if response.startswith(streamed_response) and len(response) > len(streamed_response):
+                    yield {"type": "stream", "chunk": response[len(streamed_response):]}
                 
                 # Determine if tools were used
                 used_tools = final_state.get("needs_tools", False)
-                yield {"type": "response_complete", "message": response, "used_tools": used_tools}
+                yield {
+                    "type": "response_complete",
+                    "message": response,
+                    "used_tools": used_tools,
+                    "answered_directly": final_state.get("answered_directly", False)
+                }
             else:
                 yield {"type": "error", "message": "No response generated"}
                 
@@ -689,18 +834,17 @@ Always provide the exact tool calls needed for the user's request."""
             logger.error(f"❌ Error in graph execution: {e}")
             yield {"type": "error", "message": f"Error executing workflow: {str(e)}"}
     
-    def _extract_tool_results(self, state: StreamingAgentState) -> List[Tuple[str, str]]:
+    def _extract_tool_results(self, state: Dict[str, Any]) -> List[Tuple[str, str]]:
         """Extract tool results from the conversation state"""
         tool_results = []
         
         for message in state.get("messages", []):
-            if hasattr(message, 'content') and message.content:
-                # Check if this is a tool result message
-                if "tool_result" in str(type(message)) or "ToolMessage" in str(type(message)):
-                    # Extract tool name and result
-                    tool_name = getattr(message, 'name', 'Unknown Tool')
-                    tool_result = message.content
-                    tool_results.append((tool_name, tool_result))
+            # Tool result messages carry type "tool"; no need to build the class repr per message
+            if getattr(message, 'type', None) == "tool" and message.content:
+                # Extract tool name and result
+                tool_name = getattr(message, 'name', 'Unknown Tool')
+                tool_result = message.content
+                tool_results.append((tool_name, tool_result))
         
         return tool_results
     
@@ -734,4 +878,14 @@ Always provide the exact tool calls needed for the user's request."""
                 self._mcp_initialized = False
                 logger.info("✅ MCP client closed successfully")
             except Exception as e:
-                logger.error(f"Error closing MCP client: {e}")
\ No newline at end of file
+                logger.error(f"Error closing MCP client: {e}")
+# Global instance, shared by every request so MCP sessions, bound tools and the
+# compiled graph are set up once per process
+_instance: Optional[StreamingAgent] = None
+
+def get_streaming_agent() -> StreamingAgent:
+    """Get the shared StreamingAgent, creating it on first access"""
+    global _instance
+    if _instance is None:
+        _instance = StreamingAgent()
+    return _instance